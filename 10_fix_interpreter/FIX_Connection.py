@@ -1,129 +1,32 @@
 import socket
 import time
-import simplefix
-import configparser
-from datetime import datetime as dt
 import tkinter as tk
 from tkinter import ttk
 from threading import Thread
 from queue import Queue
-import re
+from fix_messages import load_config, create_fix_message
+from fix_tokenizer import tokenize
+from liquidity_book import apply_message_all
+from fix_logger import FixLogger, OFF
+from fix_receiver import FixReceiver
 
 #change working directory to this file location
 import os
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-def load_config(config_file):
-    # Load the configuration in the config instance.
-    config = configparser.ConfigParser()
-    config.optionxform = str
-    config.read(config_file)
-
-    # Create a dictionary with the configuration options.
-    config_data = {
-        "sender_comp_id": config.get("DEFAULT", 
-                                     "SenderCompID"),
-        "target_comp_id": config.get("DEFAULT", 
-                                     "TargetCompID"),
-        "host": config.get("DEFAULT", "SocketConnectHost"),
-        "port": config.getint("DEFAULT", "SocketConnectPort"),
-        "heartbeat_interval": config.getint("DEFAULT", 
-                                            "HeartBtInt"),
-        "username": config.get("LOGIN", "Username"),
-        "password": config.get("LOGIN", "Password"),
-        "session_start": config.get("SESSION", "Start"),
-        "session_end": config.get("SESSION", "End"),
-        "timezone": config.get("SESSION", "TimeZone"),
-    }
-
-    return config_data
-
-def create_fix_message(msg_type, sender_comp_id, 
-                       target_comp_id, 
-                       sequence_number,
-                       symbols=None,
-                       **kwargs):
-    # This function creates a new FIX message.
-    # It takes as inputs the message type, sender and 
-    # target company IDs, sequence number, a list 
-    # of symbols.
-    # After that, we can specify any number of FIX tags.
-
-    # First of all, we create an empty FIX message.
-    # We append the tags that are common to all the
-    # FIX messages. These tags are:
-    # - 8: FIX version
-    # - 9: Body length
-    # - 35: Message type
-    # - 34: Sequence number
-    msg = simplefix.FixMessage()
-    msg.append_pair(8, "FIX.4.4")
-    msg.append_pair(9, None) # Body length
-    msg.append_pair(35, msg_type)
-    msg.append_pair(34, sequence_number)
-    msg.append_pair(49, sender_comp_id)
-    msg.append_pair(56, target_comp_id)
-    msg.append_pair(52, dt.utcnow().strftime("%Y%m%d-%H:%M:%S.%f")[:-3])
-
-    # After that, we include in the FIX message the tags
-    # specified in the 
-    # kwargs dictionary.
-    for tag, value in kwargs.items():
-        msg.append_pair(int(tag[1:]), value) #msg.append_pair(int(tag), value)
-
-    # If we want to send a market data subscription message,
-    # we need to include the symbols for which we want to
-    # receive market data.
-    if symbols and msg_type == "V":
-        msg.append_pair(146, str(len(symbols)))  # Añadir el número de símbolos con el tag 146
-        for symbol in symbols:
-            msg.append_pair(55, symbol)
-
-    # Finally, we need to append the checksum tag (tag 10).
-    # This tag is calculated as the modulo 256 sum of 
-    # all the characters in the message, excluding the 
-    # checksum tag itself.
-    # We append it empty and it will be filled afterwards.
-    msg.append_pair(10, None)
-    return msg
-
-
-def process_fix_messages(socket, parser, queue):
-    buffer = b""
-    while True:
-        data = socket.recv(4096)
-        if not data:
-            break
-
-        buffer += data
-        parser.append_buffer(buffer)
-        buffer = b""
-
-        while True:
-            fix_message = parser.get_message()
-            if not fix_message:
-                break
-
-            print("Received FIX message:", fix_message)
-            msg_type = fix_message.get(35)
-            if msg_type == b"W":
-                bids = []
-                asks = []
-                i = 0
-                while fix_message.get(269, i) is not None:
-                    entry_type = fix_message.get(269, i)
-                    price = fix_message.get(270, i)
-                    size = fix_message.get(271, i)
-                    
-                    if entry_type == b'0':  # Bid
-                        bids.append((float(price), float(size)))
-                    elif entry_type == b'1':  # Offer
-                        asks.append((float(price), float(size)))
-
-                    i += 1
-
-                print(f"Received Market Data: Bids: {bids}, Asks: {asks}")
-                queue.put((bids, asks))
+def process_fix_messages(socket, queue, logger=None, n_depths=5):
+    # The messages are framed in the receive buffer (fix_receiver.FixReceiver) and decoded
+    # from there, without a copy per recv or per message. A LiquidityBook per symbol is
+    # kept up to date and the sorted levels of every updated book are queued for the GUI.
+    # logger (fix_logger.FixLogger) keeps the raw messages, written by its own thread.
+    books = {}
+    receiver = FixReceiver(socket)
+    for msg_type, frame in receiver.messages():
+        if logger is not None:
+            logger.log(frame, msg_type=msg_type)
+        if msg_type == b"W" or msg_type == b"i":
+            for symbol in apply_message_all(books, msg_type.decode(), tokenize(frame), n_depths):
+                queue.put((symbol, books[symbol].levels()))
 
 
 def process_fix_message(fix_message):
@@ -159,140 +62,51 @@ class OrderBookGUI(tk.Tk):
         self.after(100, self.check_queue)
 
     def check_queue(self):
+        # The book of the last updated symbol is shown.
         while not self.queue.empty():
-            msg_type, data = self.queue.get()
-            self.update_order_book(data)
+            symbol, levels = self.queue.get()
+            self.update_order_book(symbol, levels)
         self.after(100, self.check_queue)
 
-    def update_order_book(self, data):
+    def update_order_book(self, symbol, levels):
+        # levels: LiquidityBook.levels() of the symbol, best first.
+        self.title(f"Order Book {symbol}")
         self.bid_listbox.delete(0, tk.END)
         self.ask_listbox.delete(0, tk.END)
 
-        for price, size in data["bid"], data["bid_size"]:
-            self.bid_listbox.insert(tk.END, f"{price} x {size}")
-
-        for price, size in data["ask"], data["ask_size"]:
-            self.bid_listbox.insert(tk.END, f"{price} x {size}")
+        for level in levels:
+            self.bid_listbox.insert(tk.END, f"{level['Bid']} x {level['Bid Size']}")
+            self.ask_listbox.insert(tk.END, f"{level['Ask']} x {level['Ask Size']}")
 
         self.update()
 
 
-def interpret_fix_messages(socket, parser, queue: Queue):
-    while True:
-        data = socket.recv(31661)
-        if not data:
-            print("No data received. Connection closed.")
-            break
-
-        parser.append_buffer(data)
-        while True:
-            fix_message = parser.get_message()
-            if not fix_message:
-                break
-
-            msg_type = fix_message.get(35)
-            
-            if msg_type == b"A":
-                print("Logon message received.")
-
-            elif msg_type == b"i":
-                print("Market Status message received.")
-                print(fix_message)
-                bid_size = fix_message.get(134)
-                ask_size = fix_message.get(135)
-                bid = fix_message.get(188)
-                ask = fix_message.get(190)
-                # Aquí podrías hacer algo con estos datos
-                queue.put(("MarketStatus", {'bid': bid, 'bid_size': bid_size, 'ask': ask, 'ask_size': ask_size}))
-                print(f"Received Market Status: Bid: {bid}, Bid size: {bid_size}, Ask: {ask}, Ask size: {ask_size}")
-
-            elif msg_type == b"W":
-                print("Market Data message received.")
-                bids = []
-                asks = []
-                i = 0
-                while True:
-                    entry_type = fix_message.get(269, i)
-                    if entry_type is None:
-                        break
-
-                    price = fix_message.get(270, i)
-                    size = fix_message.get(271, i)
-
-                    if entry_type == b'0':  # Bid
-                        bids.append((float(price), float(size)))
-                    elif entry_type == b'1':  # Offer
-                        asks.append((float(price), float(size)))
-
-                    i += 1
-
-                print(f"Received Market Data: Bids: {bids}, Asks: {asks}")
-                queue.put(("MarketData", {'bids': bids, 'asks': asks}))
-
-            elif msg_type == b"1":
-                print("Heartbeat message received.")
-                # Aquí podrías manejar el mensaje de latido si es necesario
-
-            elif msg_type == b"i":
-                print("Mass Quote message received.")
-                num_quotes = int(fix_message.get(295))
-                quotes = []
-
-                i = 0  # Para navegar por el mensaje FIX
-                for j in range(num_quotes):  # Para cada grupo de cotización
-                    quote_entry = {}
-                    quote_entry['quote_id'] = fix_message.get(299, i)
-                    quote_entry['bid_size'] = fix_message.get(134, i)
-                    quote_entry['bid_price'] = fix_message.get(188, i)
-                    quote_entry['offer_size'] = fix_message.get(135, i)
-                    quote_entry['offer_price'] = fix_message.get(190, i)
-
-                    quotes.append(quote_entry)
-                    i += 1  # Aumenta el índice para la próxima entrada en el mensaje FIX
-
-                print(f"Received Mass Quote: {quotes}")
-                queue.put(("MassQuote", {'quotes': quotes}))
-                
-            else:
-                print(f"Unhandled message type: {msg_type}")
-
-def parse_mass_quote(liquidity_book, fix_message):
-    # \x01 is the delimiter for FIX messages in UTF-8 = | in ASCII.
-    symbol_chunks = re.split(r'(302=[^\x01]+\x01)', fix_message.encode().decode('utf-8'))
-
-    for i in range(1, len(symbol_chunks), 2):
-        
-        level_content_all = symbol_chunks[i] + symbol_chunks[i+1]
-        level_chunks = re.split(r'(299=\d\x01)', level_content_all)
-        
-        for i in range(1, len(level_chunks), 2):
-            level_content = level_chunks[i] + level_chunks[i+1]
-            
-            level_match = re.search(r'299=([\d.]+)\x01', level_content)
-            level = int(level_match.group(1))
-            
-            bid_match = re.search(r'188=([-?\d.]+)\x01', level_content)
-            ask_match = re.search(r'190=([-?\d.]+)\x01', level_content)
-            bid_size_match = re.search(r'134=([-?\d.]+)\x01', level_content)
-            ask_size_match = re.search(r'135=([-?\d.]+)\x01', level_content)
-            
-            if bid_match:
-                liquidity_book[level]['Bid'] = float(bid_match.group(1))
-            if ask_match:
-                liquidity_book[level]['Ask'] = float(ask_match.group(1))
-            if bid_size_match:
-                size = float(bid_size_match.group(1))
-                if size < 0:  # quote cancelled.
-                    size = 0
-                    liquidity_book[level]['Bid'] = 0
-                liquidity_book[level]['Bid Size'] = size
-            if ask_size_match:
-                size = float(ask_size_match.group(1))
-                if size < 0:  # quote cancelled.
-                    size = 0
-                    liquidity_book[level]['Ask'] = 0
-                liquidity_book[level]['Ask Size'] = size
-    return liquidity_book
+def interpret_fix_messages(socket, queue: Queue, logger=None, n_depths=5):
+    # The messages are framed in the receive buffer (fix_receiver.FixReceiver) and decoded
+    # from there: the frames are only valid until the next recv.
+    # Every raw message goes to logger (fix_logger.FixLogger): the per-message prints
+    # are written and summarised by its thread, off this loop.
+    # The Mass Quotes and Full Refreshes update a LiquidityBook per symbol, whose sorted
+    # levels are queued for the GUI.
+    books = {}
+    receiver = FixReceiver(socket)
+    for msg_type, frame in receiver.messages():
+        if logger is not None:
+            logger.log(frame, msg_type=msg_type)
+
+        if msg_type == b"A":
+            print("Logon message received.")
+
+        elif msg_type == b"i" or msg_type == b"W":
+            for symbol in apply_message_all(books, msg_type.decode(), tokenize(frame), n_depths):
+                queue.put((symbol, books[symbol].levels()))
+
+        elif msg_type == b"1":
+            # Aquí podrías manejar el mensaje de latido si es necesario
+            pass
+
+    print("No data received. Connection closed.")
+
 
 def main():
     # Load the config using the configparser library and the file "myconfig.cfg".
@@ -371,18 +185,17 @@ def main():
     # This queue allows the comunication between different 
     # threads. It is passed to the GUI to access to the 
     # messages that are queued
-    # FixParser is a class from the simplefix library that
-    # parses the FIX messages.
 
     queue = Queue()
     gui = OrderBookGUI(queue)
-    parser = simplefix.FixParser()
+    # The raw messages go to the hourly quote logs, heartbeats excluded.
+    logger = FixLogger('.', verbosity={'0': OFF})
     
     # Create a thread to process the FIX messages.
     # We specified that the function process_fix_messages
     # will be the responsible for processing the messages.
-    # Besides, we pass the socket, the parser and the queue.
-    thread = Thread(target=interpret_fix_messages, args=(s, parser, queue))
+    # Besides, we pass the socket, the queue and the logger.
+    thread = Thread(target=interpret_fix_messages, args=(s, queue, logger))
     # We set the thread as a daemon thread. This means that
     # the thread will be closed when all the no daemon threads
     # are closed.
@@ -393,6 +206,7 @@ def main():
     gui.mainloop()
 
     s.close()
+    logger.close()
 
 
 if __name__ == "__main__":
@@ -7,6 +7,10 @@ import tkinter as tk
 from tkinter import ttk
 from threading import Thread
 from queue import Queue
+from fix_tokenizer import tokenize
+from liquidity_book import apply_message_all
+from fix_logger import FixLogger, OFF
+from fix_receiver import FixReceiver
 
 #change working directory to this file location
 import os
@@ -81,42 +85,19 @@ def create_fix_message(msg_type, sender_comp_id,
     return msg
 
 
-def process_fix_messages(socket, parser, queue):
-    buffer = b""
-    while True:
-        data = socket.recv(4096)
-        if not data:
-            break
-
-        buffer += data
-        parser.append_buffer(buffer)
-        buffer = b""
-
-        while True:
-            fix_message = parser.get_message()
-            if not fix_message:
-                break
-
-            print("Received FIX message:", fix_message)
-            msg_type = fix_message.get(35)
-            if msg_type == b"W":
-                bids = []
-                asks = []
-                i = 0
-                while fix_message.get(269, i) is not None:
-                    entry_type = fix_message.get(269, i)
-                    price = fix_message.get(270, i)
-                    size = fix_message.get(271, i)
-                    
-                    if entry_type == b'0':  # Bid
-                        bids.append((float(price), float(size)))
-                    elif entry_type == b'1':  # Offer
-                        asks.append((float(price), float(size)))
-
-                    i += 1
-
-                print(f"Received Market Data: Bids: {bids}, Asks: {asks}")
-                queue.put((bids, asks))
+def process_fix_messages(socket, queue, logger=None, n_depths=5):
+    # The messages are framed in the receive buffer (fix_receiver.FixReceiver) and decoded
+    # from there, without a copy per recv or per message. A LiquidityBook per symbol is
+    # kept up to date and the sorted levels of every updated book are queued for the GUI.
+    # logger (fix_logger.FixLogger) keeps the raw messages, written by its own thread.
+    books = {}
+    receiver = FixReceiver(socket)
+    for msg_type, frame in receiver.messages():
+        if logger is not None:
+            logger.log(frame, msg_type=msg_type)
+        if msg_type == b"W" or msg_type == b"i":
+            for symbol in apply_message_all(books, msg_type.decode(), tokenize(frame), n_depths):
+                queue.put((symbol, books[symbol].levels()))
 
 
 def process_fix_message(fix_message):
@@ -152,20 +133,21 @@ class OrderBookGUI(tk.Tk):
         self.after(100, self.check_queue)
 
     def check_queue(self):
+        # The book of the last updated symbol is shown.
         while not self.queue.empty():
-            bids, asks = self.queue.get()
-            self.update_order_book(bids, asks)
+            symbol, levels = self.queue.get()
+            self.update_order_book(symbol, levels)
         self.after(100, self.check_queue)
 
-    def update_order_book(self, bids, asks):
+    def update_order_book(self, symbol, levels):
+        # levels: LiquidityBook.levels() of the symbol, best first.
+        self.title(f"Order Book {symbol}")
         self.bid_listbox.delete(0, tk.END)
         self.ask_listbox.delete(0, tk.END)
 
-        for price, size in bids:
-            self.bid_listbox.insert(tk.END, f"{price} x {size}")
-
-        for price, size in asks:
-            self.ask_listbox.insert(tk.END, f"{price} x {size}")
+        for level in levels:
+            self.bid_listbox.insert(tk.END, f"{level['Bid']} x {level['Bid Size']}")
+            self.ask_listbox.insert(tk.END, f"{level['Ask']} x {level['Ask Size']}")
 
         self.update()
 
@@ -244,18 +226,17 @@ def main():
     # This queue allows the comunication between different 
     # threads. It is passed to the GUI to access to the 
     # messages that are queued
-    # FixParser is a class from the simplefix library that
-    # parses the FIX messages.
 
     queue = Queue()
     gui = OrderBookGUI(queue)
-    parser = simplefix.FixParser()
+    # The raw messages go to the hourly quote logs, heartbeats excluded.
+    logger = FixLogger('.', verbosity={'0': OFF})
     
     # Create a thread to process the FIX messages.
     # We specified that the function process_fix_messages
     # will be the responsible for processing the messages.
-    # Besides, we pass the socket, the parser and the queue.
-    thread = Thread(target=process_fix_messages, args=(s, parser, queue))
+    # Besides, we pass the socket, the queue and the logger.
+    thread = Thread(target=process_fix_messages, args=(s, queue, logger))
     # We set the thread as a daemon thread. This means that
     # the thread will be closed when all the no daemon threads
     # are closed.
@@ -266,6 +247,7 @@ def main():
     gui.mainloop()
 
     s.close()
+    logger.close()
 
 
 if __name__ == "__main__":
@@ -1,58 +1,21 @@
-import re
 from datetime import datetime
+from book_checkpoints import book_at
+from liquidity_book import sort_liquidity_book
 
-def parse_fix_log_v9(file_path, target_symbol, target_time):
-    liquidity_book = {level: {'Bid': 0.0, 'Ask': 0.0, 'Bid Size': 0.0, 'Ask Size': 0.0} for level in range(5)}
+def parse_fix_log_v9(file_path, target_symbol, target_time, store_path=None):
     target_time_obj = datetime.strptime(target_time, '%Y-%m-%d %H:%M:%S.%f')
 
-    with open(file_path, 'r') as file:
-        for line in file:
-            msg_time = datetime.strptime(line.split('|')[0], '%Y-%m-%d %H:%M:%S.%f')
-            if msg_time > target_time_obj:
-                break
+    if store_path is not None:
+        # The book is rebuilt from the tick store (tick_store.convert_log) instead of parsing file_path.
+        from tick_store import replay_store
+        liquidity_book, df = replay_store(store_path, target_symbol, target_time_obj, spreads=False)
+    else:
+        # Replays only the lines after the nearest checkpoint.
+        liquidity_book = book_at(file_path, target_symbol, target_time_obj)
+    # The levels are sorted once at the end.
+    liquidity_book = sort_liquidity_book(liquidity_book)
+    return {level: data for level, data in enumerate(liquidity_book)}
 
-            symbol_chunks = re.split(r'(302=[A-Z0-9_]+\x01)', line)
-            for i in range(1, len(symbol_chunks), 2):
-                if target_symbol in symbol_chunks[i]:
-                    level_content = symbol_chunks[i] + symbol_chunks[i+1]
-
-                    level_match = re.search(r'299=([\d.]+)\x01', level_content)
-                    level = int(level_match.group(1))
-
-                    bid_match = re.search(r'188=([\d.]+)\x01', level_content)
-                    ask_match = re.search(r'190=([\d.]+)\x01', level_content)
-                    bid_size_match = re.search(r'134=([\d.]+)\x01', level_content)
-                    ask_size_match = re.search(r'135=([\d.]+)\x01', level_content)
-
-                    if bid_match:
-                        liquidity_book[level]['Bid'] = float(bid_match.group(1))
-                    if ask_match:
-                        liquidity_book[level]['Ask'] = float(ask_match.group(1))
-                    if bid_size_match:
-                        liquidity_book[level]['Bid Size'] = int(bid_size_match.group(1))
-                    if ask_size_match:
-                        liquidity_book[level]['Ask Size'] = int(ask_size_match.group(1))
-
-                    
-                     # Reorder Bid and Bid Size columns
-                    for l in reversed(range(5)):
-                        # Reorder Bid and Bid Size columns
-                        for i in range(l, 0, -1):
-                            if liquidity_book[i]['Bid'] > liquidity_book[i - 1]['Bid']:
-                                liquidity_book[i]['Bid'], liquidity_book[i - 1]['Bid'] = liquidity_book[i - 1]['Bid'], liquidity_book[i]['Bid']
-                                liquidity_book[i]['Bid Size'], liquidity_book[i - 1]['Bid Size'] = liquidity_book[i - 1]['Bid Size'], liquidity_book[i]['Bid Size']
-                            else:
-                                break
-
-                        # Reorder Ask and Ask Size columns
-                        for i in range(l, 0, -1):
-                            if liquidity_book[i]['Ask'] < liquidity_book[i - 1]['Ask']:
-                                liquidity_book[i]['Ask'], liquidity_book[i - 1]['Ask'] = liquidity_book[i - 1]['Ask'], liquidity_book[i]['Ask']
-                                liquidity_book[i]['Ask Size'], liquidity_book[i - 1]['Ask Size'] = liquidity_book[i - 1]['Ask Size'], liquidity_book[i]['Ask Size']
-                            else:
-                                break
-
-    return liquidity_book
 # rango entre 4 y 0, de 1 en 1 con range
 
 
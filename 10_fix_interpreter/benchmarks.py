@@ -0,0 +1,319 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from synthetic_log import generate_log, symbol_names
+from log_index import read_lines
+from log_time import line_time_ns
+from fix_tokenizer import tokenize
+from mmap_scan import scan_symbol, decode_lines
+from liquidity_book import new_liquidity_book, apply_line
+from book_checkpoints import build_checkpoints, book_at
+from book_snapshots import book_snapshots
+from multi_symbol_replay import replay_symbols
+
+
+"""
+
+Benchmark suite for the log replay stages, over a synthetic quote log (synthetic_log)
+or a real one.
+
+Every stage runs in a fresh process and reports, for its timed section only (the
+setup, e.g. loading the lines a stage iterates over, is neither timed nor measured):
+
+    msgs/s   log messages processed per second
+    MB/s     log bytes processed per second
+    peak MB  peak resident memory during the section above the memory before it
+
+Results are compared with the baselines stored in benchmark_baseline.json for the
+same log: a stage more than --tolerance slower (msgs/s) or bigger (peak MB) is
+flagged as a regression and the exit code is 1.
+
+    python benchmarks.py                          synthetic log, compare with the baselines
+    python benchmarks.py --save-baseline          store this run as the baselines
+    python benchmarks.py --log 20230425-0800_quote.log --stages filter_file analyze_fix_log
+
+"""
+
+BASELINE_FILE = 'benchmark_baseline.json'
+TOLERANCE = 0.2
+
+
+# Linux reports the peak RSS in kB and macOS in bytes.
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def _status_kb(field):
+    # VmRSS / VmHWM of this process in kB, None where /proc is not available.
+    try:
+        with open('/proc/self/status', 'r') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    # Resets VmHWM to the current RSS (Linux). Returns False where it can not be reset.
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        return False
+    return _status_kb('VmHWM') is not None
+
+
+class _Section:
+    # Times the with block and measures the peak memory it adds. Where the peak RSS can
+    # not be reset the growth of ru_maxrss is used, a lower bound.
+
+    def __enter__(self):
+        self.reset = _reset_peak_rss()
+        self.rss_kb = _status_kb('VmRSS') if self.reset else None
+        self.maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+        if self.reset:
+            peak_kb = _status_kb('VmHWM') - self.rss_kb
+        else:
+            peak_kb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - self.maxrss) * MAXRSS_UNIT / 1024
+        self.peak_mb = max(peak_kb, 0) / 1024
+
+
+# Every stage returns (messages, bytes, _Section) and measures only its own work.
+
+def _stage_read_lines(file_path, symbol):
+    with _Section() as section:
+        messages = sum(1 for line in read_lines(file_path))
+    return messages, os.path.getsize(file_path), section
+
+
+def _stage_log_time(file_path, symbol):
+    lines = list(read_lines(file_path))
+    with _Section() as section:
+        for line in lines:
+            line_time_ns(line)
+    return len(lines), os.path.getsize(file_path), section
+
+
+def _stage_tokenize(file_path, symbol):
+    lines = list(read_lines(file_path))
+    with _Section() as section:
+        for line in lines:
+            tokenize(line)
+    return len(lines), os.path.getsize(file_path), section
+
+
+def _stage_filter_file(file_path, symbol):
+    # The whole log is scanned for the lines of one symbol.
+    messages = sum(1 for line in read_lines(file_path))
+    with _Section() as section:
+        for line in decode_lines(scan_symbol(file_path, symbol)):
+            pass
+    return messages, os.path.getsize(file_path), section
+
+
+def _stage_parse(file_path, symbol):
+    # parse_mass_quote / parse_full_refresh on the lines of one symbol.
+    lines = list(decode_lines(scan_symbol(file_path, symbol)))
+    target_symbol_str = "=" + symbol + '\x01'
+    liquidity_book = new_liquidity_book()
+    with _Section() as section:
+        for line in lines:
+            apply_line(liquidity_book, line, target_symbol_str)
+    return len(lines), sum(len(line) for line in lines), section
+
+
+def _stage_analyze_fix_log(file_path, symbol):
+    # analyze_fix_log with the spread series, without opening the chart. Imported here
+    # because plot_spread_from_logs changes the working directory on import.
+    import plot_spread_from_logs
+
+    messages = sum(1 for line in read_lines(file_path))
+    last_time = _last_time(file_path)
+    plot_spread_from_logs.plot_data = lambda df, target_symbol: None
+    with _Section() as section:
+        with contextlib.redirect_stdout(io.StringIO()):
+            plot_spread_from_logs.analyze_fix_log(symbol, last_time, file_path)
+    return messages, os.path.getsize(file_path), section
+
+
+def _stage_replay_symbols(file_path, symbol):
+    messages = sum(1 for line in read_lines(file_path))
+    with _Section() as section:
+        replay_symbols(file_path)
+    return messages, os.path.getsize(file_path), section
+
+
+def _stage_build_checkpoints(file_path, symbol):
+    messages = sum(1 for line in read_lines(file_path))
+    with _Section() as section:
+        build_checkpoints(file_path)
+    return messages, os.path.getsize(file_path), section
+
+
+def _stage_book_at(file_path, symbol, queries=100):
+    # Point-in-time queries spread over the log, with the checkpoints already built.
+    build_checkpoints(file_path)
+    times = _query_times(file_path, queries)
+    with _Section() as section:
+        for target_time in times:
+            book_at(file_path, symbol, target_time)
+    return queries, 0, section
+
+
+def _stage_book_snapshots(file_path, symbol, queries=10000):
+    build_checkpoints(file_path)
+    times = _query_times(file_path, queries)
+    with _Section() as section:
+        book_snapshots(file_path, times, [symbol])
+    return queries, 0, section
+
+
+STAGES = {
+    'read_lines': _stage_read_lines,
+    'log_time_ns': _stage_log_time,
+    'tokenize': _stage_tokenize,
+    'filter_file': _stage_filter_file,
+    'parse_quotes': _stage_parse,
+    'analyze_fix_log': _stage_analyze_fix_log,
+    'replay_symbols': _stage_replay_symbols,
+    'build_checkpoints': _stage_build_checkpoints,
+    'book_at': _stage_book_at,
+    'book_snapshots': _stage_book_snapshots,
+}
+
+
+def _first_time(file_path):
+    with open(file_path, 'r') as log_file:
+        return log_file.readline().split('|', 1)[0]
+
+
+def _last_time(file_path):
+    with open(file_path, 'rb') as log_file:
+        log_file.seek(max(os.path.getsize(file_path) - 65536, 0))
+        return log_file.read().splitlines()[-1].split(b'|', 1)[0].decode()
+
+
+def _query_times(file_path, queries):
+    return pd.date_range(_first_time(file_path), _last_time(file_path), periods=queries)
+
+
+def _run_stage(name, file_path, symbol):
+    # Runs in its own process.
+    messages, n_bytes, section = STAGES[name](file_path, symbol)
+    seconds = section.seconds
+    return {
+        'messages': messages,
+        'seconds': seconds,
+        'msgs/s': messages / seconds if seconds else float('inf'),
+        'MB/s': n_bytes / 1e6 / seconds if seconds else float('inf'),
+        'peak MB': section.peak_mb,
+    }
+
+
+def run_benchmarks(file_path, symbol, stages=None):
+    # {stage: metrics}, every stage in a fresh process.
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for name in stages or STAGES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(_run_stage, name, file_path, symbol).result()
+    return results
+
+
+def find_regressions(results, baseline, tolerance=TOLERANCE):
+    # [(stage, metric, value, baseline value)] worse than the baseline by more than tolerance.
+    regressions = []
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        if metrics['msgs/s'] < baseline[name]['msgs/s'] * (1 - tolerance):
+            regressions.append((name, 'msgs/s', metrics['msgs/s'], baseline[name]['msgs/s']))
+        if metrics['peak MB'] > baseline[name]['peak MB'] * (1 + tolerance):
+            regressions.append((name, 'peak MB', metrics['peak MB'], baseline[name]['peak MB']))
+    return regressions
+
+
+def load_baselines(baseline_path):
+    try:
+        with open(baseline_path, 'r') as baseline_file:
+            return json.load(baseline_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def synthetic_log(n_messages, n_symbols, n_depths, rate, full_refresh_ratio, cancel_ratio, seed):
+    # Generated once per configuration in the temp dir. Returns (path, baseline key).
+    key = f'synthetic-{n_messages}x{n_symbols}x{n_depths}-r{rate:g}-w{full_refresh_ratio:g}-c{cancel_ratio:g}-s{seed}'
+    file_path = os.path.join(tempfile.gettempdir(), f'fix_benchmark_{key}_quote.log')
+    if not os.path.exists(file_path):
+        generate_log(file_path + '.tmp', n_messages, n_symbols, n_depths, rate, full_refresh_ratio, cancel_ratio, seed=seed)
+        os.replace(file_path + '.tmp', file_path)
+    return file_path, key
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the quote log replay stages.')
+    parser.add_argument('--log', help='benchmark this log instead of a synthetic one')
+    parser.add_argument('--symbol', help='symbol of the single symbol stages (default: the first one)')
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--depths', type=int, default=5)
+    parser.add_argument('--rate', type=float, default=1000.0, help='messages per second of log time')
+    parser.add_argument('--full-refresh-ratio', type=float, default=0.05)
+    parser.add_argument('--cancel-ratio', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--baseline', help=f'baseline file (default: {BASELINE_FILE} next to this script)')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    # The paths given are relative to the caller's directory.
+    if args.log:
+        args.log = os.path.abspath(args.log)
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else BASELINE_FILE
+
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.log:
+        file_path, key = args.log, os.path.basename(args.log)
+        symbol = args.symbol or 'EURUSD_0'
+    else:
+        file_path, key = synthetic_log(args.messages, args.symbols, args.depths, args.rate,
+                                       args.full_refresh_ratio, args.cancel_ratio, args.seed)
+        symbol = args.symbol or symbol_names(args.symbols)[0]
+
+    results = run_benchmarks(file_path, symbol, args.stages)
+    print(f'{key} ({os.path.getsize(file_path) / 1e6:.1f} MB), symbol {symbol}')
+    print(pd.DataFrame(results).T.round(2).to_string())
+
+    baselines = load_baselines(args.baseline)
+    if args.save_baseline:
+        baselines.setdefault(key, {}).update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2)
+        print(f'baseline saved to {args.baseline}')
+    else:
+        regressions = find_regressions(results, baselines.get(key, {}), args.tolerance)
+        for name, metric, value, base in regressions:
+            print(f'REGRESSION {name}: {metric} {value:.2f} vs baseline {base:.2f}')
+        if regressions:
+            raise SystemExit(1)
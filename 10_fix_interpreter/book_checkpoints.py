@@ -0,0 +1,178 @@
+import json
+from bisect import bisect_right
+
+from log_index import find_offset
+from log_time import log_time_ns, to_ns, NS_PER_SECOND
+from log_files import open_log, log_size
+from mmap_scan import scan_symbol, decode_lines
+from liquidity_book import LiquidityBook, new_liquidity_book, apply_line, apply_line_all
+
+
+"""
+
+Periodic liquidity book checkpoints for quote logs (20230425-0800_quote.log -> 20230425-0800_quote.log.ckpt).
+
+Every `every_seconds` of log time or `every_messages` book updates the books of all
+the symbols seen so far are written with the byte offset where they are valid.
+A point-in-time query loads the last checkpoint before target_time and replays only
+the lines after it.
+
+Checkpoint file layout: a json header with the build parameters, then one line per
+checkpoint: time|offset|{symbol: [[Bid, Ask, Bid Size, Ask Size], ...]}, and after
+every build or extension an END|offset line with the end of the log lines read, so a
+tail without book updates is not replayed again by every query.
+
+"""
+
+CHECKPOINT_SUFFIX = '.ckpt'
+CHECKPOINT_SECONDS = 60
+CHECKPOINT_MESSAGES = 100000
+BOOK_FIELDS = ('Bid', 'Ask', 'Bid Size', 'Ask Size')
+END_MARK = b'END'
+
+
+def checkpoint_path(file_path):
+    return file_path + CHECKPOINT_SUFFIX
+
+
+def _pack_books(books):
+    return {symbol: book.slots() for symbol, book in books.items()}
+
+
+def _unpack_book(packed_book):
+    return LiquidityBook.from_slots(packed_book)
+
+
+def _write_checkpoints(file_path, ckpt_file, books, offset, every_seconds, every_messages, n_depths):
+    # Replays the complete lines from offset, writing a checkpoint every
+    # every_seconds / every_messages, a last one after the last update and the
+    # END line with the offset read up to.
+    pending = 0
+    current_second = None
+    checkpoint_time = None
+    time_str = None
+
+    with open_log(file_path, offset) as file:
+        for raw_line in file:
+            if not raw_line.endswith(b'\n'):
+                break  # partial trailing line.
+            offset += len(raw_line)
+            line = raw_line.decode()
+            time_str = line.split('|', 1)[0]
+
+            if apply_line_all(books, line, n_depths):
+                pending += 1
+
+            # Log time only needs to be parsed when the second changes.
+            if time_str[:19] != current_second:
+                current_second = time_str[:19]
+                msg_time = log_time_ns(time_str)
+                if checkpoint_time is None:
+                    checkpoint_time = msg_time
+                elif msg_time - checkpoint_time >= every_seconds * NS_PER_SECOND:
+                    pending = every_messages
+
+            if pending >= every_messages:
+                ckpt_file.write(f"{time_str}|{offset}|{json.dumps(_pack_books(books))}\n")
+                checkpoint_time = log_time_ns(time_str)
+                pending = 0
+
+    if pending and time_str is not None:
+        ckpt_file.write(f"{time_str}|{offset}|{json.dumps(_pack_books(books))}\n")
+    ckpt_file.write(f"{END_MARK.decode()}|{offset}\n")
+
+
+def build_checkpoints(file_path, every_seconds=CHECKPOINT_SECONDS, every_messages=CHECKPOINT_MESSAGES, n_depths=5):
+    header = {'n_depths': n_depths, 'every_seconds': every_seconds, 'every_messages': every_messages}
+    with open(checkpoint_path(file_path), 'w') as ckpt_file:
+        ckpt_file.write(json.dumps(header) + '\n')
+        _write_checkpoints(file_path, ckpt_file, {}, 0, every_seconds, every_messages, n_depths)
+
+
+def _read_checkpoint_list(file_path):
+    # Returns the header, the (time, offset, position in the checkpoint file) of every
+    # checkpoint and the offset of the log read when they were written.
+    checkpoints = []
+    scanned_offset = 0
+    with open(checkpoint_path(file_path), 'rb') as ckpt_file:
+        header = json.loads(ckpt_file.readline())
+        position = ckpt_file.tell()
+        for raw_line in ckpt_file:
+            if raw_line.endswith(b'\n'):
+                time_str, offset = raw_line.split(b'|', 2)[:2]
+                if time_str == END_MARK:
+                    scanned_offset = int(offset)
+                else:
+                    checkpoints.append((time_str.decode(), int(offset), position))
+                    scanned_offset = max(scanned_offset, int(offset))
+            position += len(raw_line)
+    return header, checkpoints, scanned_offset
+
+
+def _read_checkpoint(file_path, position):
+    with open(checkpoint_path(file_path), 'rb') as ckpt_file:
+        ckpt_file.seek(position)
+        books = ckpt_file.readline().split(b'|', 2)[2]
+    return json.loads(books)
+
+
+def checkpoint_books(file_path, checkpoint):
+    # {symbol: liquidity_book} stored in a checkpoint of the list.
+    time_str, offset, position = checkpoint
+    return {symbol: _unpack_book(book) for symbol, book in _read_checkpoint(file_path, position).items()}
+
+
+def load_checkpoints(file_path, every_seconds=CHECKPOINT_SECONDS, every_messages=CHECKPOINT_MESSAGES, n_depths=5):
+    # Returns the checkpoint list of file_path, building it the first time and
+    # extending it from the last checkpoint when the log has grown.
+    header = {'n_depths': n_depths, 'every_seconds': every_seconds, 'every_messages': every_messages}
+    try:
+        stored_header, checkpoints, scanned_offset = _read_checkpoint_list(file_path)
+    except (OSError, ValueError):
+        stored_header, checkpoints, scanned_offset = None, [], 0
+
+    file_size = log_size(file_path)
+    if stored_header != header or scanned_offset > file_size:
+        build_checkpoints(file_path, every_seconds, every_messages, n_depths)
+    elif scanned_offset < file_size:
+        # No update after the last checkpoint up to scanned_offset: its books are still valid there.
+        books = {}
+        if checkpoints:
+            books = checkpoint_books(file_path, checkpoints[-1])
+        with open(checkpoint_path(file_path), 'a') as ckpt_file:
+            _write_checkpoints(file_path, ckpt_file, books, scanned_offset, every_seconds, every_messages, n_depths)
+    else:
+        return checkpoints
+
+    return _read_checkpoint_list(file_path)[1]
+
+
+def nearest_checkpoint(file_path, target_symbol, target_time, n_depths=5, checkpoints=None):
+    # Book of target_symbol at the last checkpoint before target_time and the
+    # offset where the replay has to continue from.
+    if checkpoints is None:
+        checkpoints = load_checkpoints(file_path, n_depths=n_depths)
+    target_ns = to_ns(target_time)
+
+    i = bisect_right(checkpoints, target_ns, key=lambda c: log_time_ns(c[0])) - 1
+    if i >= 0:
+        time_str, offset, position = checkpoints[i]
+        books = _read_checkpoint(file_path, position)
+        if target_symbol in books:
+            return _unpack_book(books[target_symbol]), offset
+        return new_liquidity_book(n_depths), offset  # symbol not quoted yet.
+    return new_liquidity_book(n_depths), 0
+
+
+def book_at(file_path, target_symbol, target_time, n_depths=5):
+    # Unsorted liquidity book of target_symbol at target_time, replaying only
+    # from the nearest checkpoint.
+    target_time = to_ns(target_time)
+    target_symbol_str = "=" + target_symbol + '\x01'
+
+    liquidity_book, start_offset = nearest_checkpoint(file_path, target_symbol, target_time, n_depths)
+    end_offset = find_offset(file_path, target_time)
+
+    for line in decode_lines(scan_symbol(file_path, target_symbol, start_offset, end_offset)):
+        apply_line(liquidity_book, line, target_symbol_str)
+    return liquidity_book
@@ -0,0 +1,115 @@
+import os
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+import pandas as pd
+
+from log_index import read_lines, LOG_TIME_FORMAT
+from mmap_scan import scan_symbol, decode_lines
+from liquidity_book import apply_line_all
+from book_checkpoints import BOOK_FIELDS, load_checkpoints, checkpoint_books
+
+
+"""
+
+Batch point-in-time query: the sorted liquidity book at many times with one pass over the log.
+
+    snapshots = book_snapshots(file_path, query_times, symbols=['EURUSD_0'])
+    snapshots['EURUSD_0']    shape [query, n_depths, 4] with the BOOK_FIELDS of every level, best first
+
+The replay starts at the last checkpoint before the first query time and stops after
+the last one. Every query gets the books as they were after the last message logged
+at or before its time (same as book_at), symbols not quoted yet get an empty book.
+Log times are fixed width, so the queries are compared with the log lines as strings.
+
+"""
+
+def _time_strings(query_times):
+    # Log time strings (ms) of the query times. Truncating is right: a line at a whole
+    # ms is after the query exactly when it is after its truncated time.
+    return [time_str[:-3] for time_str in pd.DatetimeIndex(pd.to_datetime(query_times)).strftime(LOG_TIME_FORMAT)]
+
+
+def _log_lines(file_path, offset, symbols):
+    if symbols is not None and len(symbols) == 1:
+        return decode_lines(scan_symbol(file_path, next(iter(symbols)), offset))
+    return read_lines(file_path, start_offset=offset)
+
+
+def book_snapshots(file_path, query_times, symbols=None, n_depths=5):
+    # {symbol: array [query, level, field]} in the order of query_times (any order).
+    query_strs = _time_strings(query_times)
+    order = sorted(range(len(query_strs)), key=query_strs.__getitem__)
+    sorted_strs = [query_strs[k] for k in order]
+    if symbols is not None:
+        symbols = set(symbols)
+
+    books, offset = {}, 0
+    snapshots = {}
+    if sorted_strs:
+        checkpoints = load_checkpoints(file_path, n_depths=n_depths)
+        i = bisect_right(checkpoints, sorted_strs[0], key=lambda c: c[0]) - 1
+        if i >= 0:
+            books = checkpoint_books(file_path, checkpoints[i])
+            offset = checkpoints[i][1]
+            if symbols is not None:
+                books = {symbol: book for symbol, book in books.items() if symbol in symbols}
+
+    def emit(start, stop):
+        # Snapshot of the current books for the queries [start, stop).
+        for symbol, book in books.items():
+            if symbol not in snapshots:
+                snapshots[symbol] = np.zeros((len(sorted_strs), n_depths, len(BOOK_FIELDS)))
+            snapshots[symbol][start:stop] = book.rows()
+
+    needles = None
+    if symbols is not None:
+        needles = ["=" + symbol + '\x01' for symbol in symbols]
+
+    done = 0  # queries already answered.
+    if sorted_strs:
+        for line in _log_lines(file_path, offset, symbols):
+            if needles is not None and not any(needle in line for needle in needles):
+                continue
+            time_str = line.split('|', 1)[0]
+            if time_str > sorted_strs[done]:
+                # The line is after some queries: they see the books before it.
+                stop = bisect_left(sorted_strs, time_str, done)
+                emit(done, stop)
+                done = stop
+                if done == len(sorted_strs):
+                    break
+            apply_line_all(books, line, n_depths, symbols)
+        emit(done, len(sorted_strs))
+
+    # Back to the order of query_times.
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.arange(len(order))
+    if symbols is not None:
+        for symbol in symbols:
+            snapshots.setdefault(symbol, np.zeros((len(sorted_strs), n_depths, len(BOOK_FIELDS))))
+    return {symbol: snapshots[symbol][inverse] for symbol in sorted(snapshots)}
+
+
+def snapshots_frame(query_times, snapshots):
+    # DataFrame of book_snapshots indexed by (symbol, time, level), BOOK_FIELDS columns.
+    times = pd.DatetimeIndex(pd.to_datetime(query_times))
+    frames = {}
+    for symbol, snapshot in snapshots.items():
+        n_queries, n_depths, n_fields = snapshot.shape
+        index = pd.MultiIndex.from_arrays([np.repeat(times, n_depths), np.tile(np.arange(n_depths), n_queries)], names=['time', 'level'])
+        frames[symbol] = pd.DataFrame(snapshot.reshape(n_queries * n_depths, n_fields), index=index, columns=list(BOOK_FIELDS))
+    return pd.concat(frames, names=['symbol'])
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+
+    # Book every 100 ms over one minute.
+    query_times = pd.date_range('2023-04-25 07:05:00', '2023-04-25 07:06:00', freq='100ms')
+    snapshots = book_snapshots(file_path, query_times, symbols=['AUDNZD_0', 'EURUSD_0'])
+    print(snapshots_frame(query_times, snapshots))
@@ -0,0 +1,162 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from log_time import line_time_ns, to_ns
+from log_files import is_compressed, log_size
+from mmap_scan import scan_symbol, decode_lines
+from liquidity_book import LiquidityBook, new_liquidity_book, apply_line
+from book_checkpoints import BOOK_FIELDS
+
+
+"""
+
+Book timeline of one symbol: the liquidity book after every message of the log,
+as arrays, so the book at any time is a searchsorted away.
+
+    times  int64 ns of every message, shape [messages]
+    books  shape [messages, n_depths, 4] with the BOOK_FIELDS of every level (unsorted)
+
+The rows are written into preallocated arrays that double when full (as in
+SpreadRecorder), never through a list per message. BookTimeline.update reads only
+the lines appended since the last call, so a log still being written is extended
+rather than rebuilt, and TimelineCache keeps the timelines of several logs/symbols
+within a memory budget.
+
+"""
+
+TAIL_BLOCK = 64 * 1024
+TIMELINE_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def _complete_end(file_path):
+    # Offset after the last complete line (the writer may be in the middle of one).
+    if is_compressed(file_path):
+        return log_size(file_path)
+    with open(file_path, 'rb') as file:
+        end = file.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - TAIL_BLOCK, 0)
+            file.seek(start)
+            newline = file.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+class BookTimeline:
+    def __init__(self, file_path, target_symbol, n_depths=5, capacity=4096):
+        self.file_path = file_path
+        self.target_symbol = target_symbol
+        self.n_depths = n_depths
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.size = 0
+        self.offset = 0  # log bytes replayed so far.
+        self.times = np.empty(self._capacity, dtype=np.int64)
+        self.books = np.empty((self._capacity, self.n_depths, len(BOOK_FIELDS)), dtype=np.float64)
+        self._book = new_liquidity_book(self.n_depths)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.books.nbytes
+
+    def _grow(self):
+        capacity = 2 * len(self.times)
+        times = np.empty(capacity, dtype=np.int64)
+        times[:self.size] = self.times[:self.size]
+        books = np.empty((capacity,) + self.books.shape[1:], dtype=np.float64)
+        books[:self.size] = self.books[:self.size]
+        self.times, self.books = times, books
+
+    def update(self):
+        # Replays the complete lines appended since the last update (all of them the
+        # first time, again from the start if the log was truncated or replaced).
+        # Returns the number of new messages.
+        with self._lock:
+            end_offset = _complete_end(self.file_path)
+            if end_offset < self.offset:
+                self._reset()
+            if end_offset == self.offset:
+                return 0
+
+            target_symbol_str = "=" + self.target_symbol + '\x01'
+            liquidity_book = self._book
+            start_size = self.size
+            lines = decode_lines(scan_symbol(self.file_path, self.target_symbol, self.offset, end_offset))
+            for line in lines:
+                if not apply_line(liquidity_book, line, target_symbol_str):
+                    continue
+                if self.size == len(self.times):
+                    self._grow()
+                i = self.size
+                self.times[i] = line_time_ns(line)
+                book = self.books[i]
+                book[:, 0] = liquidity_book.bid
+                book[:, 1] = liquidity_book.ask
+                book[:, 2] = liquidity_book.bid_size
+                book[:, 3] = liquidity_book.ask_size
+                self.size = i + 1
+            self.offset = end_offset
+            return self.size - start_size
+
+    def arrays(self):
+        # (times, books) of the messages so far. The rows already written never change,
+        # so the views stay valid while the timeline is extended.
+        size = self.size
+        return self.times[:size], self.books[:size]
+
+
+class TimelineCache:
+    # BookTimelines by (log, symbol), up to date with their log. The least recently used
+    # ones are dropped while the arrays take more than max_bytes.
+
+    def __init__(self, max_bytes=TIMELINE_CACHE_BYTES, n_depths=5):
+        self.max_bytes = max_bytes
+        self.n_depths = n_depths
+        self._timelines = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path, target_symbol):
+        key = (file_path, target_symbol)
+        with self._lock:
+            timeline = self._timelines.get(key)
+            if timeline is None:
+                timeline = self._timelines[key] = BookTimeline(file_path, target_symbol, self.n_depths)
+            self._timelines.move_to_end(key)
+        timeline.update()
+        with self._lock:
+            # The timeline just used is the last one, never dropped.
+            while len(self._timelines) > 1 and self.nbytes > self.max_bytes:
+                self._timelines.popitem(last=False)
+        return timeline
+
+    @property
+    def nbytes(self):
+        return sum(timeline.nbytes for timeline in self._timelines.values())
+
+
+def build_timeline(file_path, target_symbol, n_depths=5):
+    timeline = BookTimeline(file_path, target_symbol, n_depths)
+    timeline.update()
+    return timeline.arrays()
+
+
+def book_from_timeline(timeline, target_time):
+    # Sorted liquidity book at target_time. timeline is (times, books) or a BookTimeline.
+    times, books = timeline.arrays() if isinstance(timeline, BookTimeline) else timeline
+    i = np.searchsorted(times, to_ns(target_time), side='right') - 1
+
+    n_depths = books.shape[1]
+    if i < 0:
+        return new_liquidity_book(n_depths).levels()
+    return LiquidityBook.from_slots(books[i].tolist()).levels()
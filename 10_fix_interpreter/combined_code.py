@@ -1,7 +1,6 @@
 from plot_spread_from_logs import print_fix
-from plot_spread_from_logs import parse_mass_quote
-from plot_spread_from_logs import parse_full_refresh
-from plot_spread_from_logs import add_spread_data
+from liquidity_book import parse_mass_quote
+from liquidity_book import parse_full_refresh
 from plot_spread_from_logs import plot_data
 from plot_spread_from_logs import analyze_fix_log
 
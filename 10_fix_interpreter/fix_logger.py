@@ -0,0 +1,244 @@
+import os
+import sys
+import time
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from fix_tokenizer import tokenize, quote_sets, md_entries
+
+
+"""
+
+Message log of the live FIX sessions, off the receive path.
+
+The receive thread only copies the raw message and its receive time into a ring
+buffer allocated once (FixLogger.log, about 2 us, never blocks: when the ring
+is full the message is counted in dropped instead). A background thread flushes the
+ring in batches to hourly files in the format of the quote logs the log tools read:
+
+    20230425-0800_quote.log:   2023-04-25 07:00:00.123|8=FIX.4.4\x019=...\x0110=...\x01
+
+The line timestamps are always UTC. The file name is the hour of the message in
+name_timezone, by default the local time of the machine as in the existing logs (the
+file above was written at UTC+1), and the file rotates on the hour.
+
+Verbosity per MsgType (35):
+
+    OFF      not logged (e.g. heartbeats)
+    RAW      written to the log file (default)
+    SUMMARY  written, plus a decoded one-line summary printed by the writer thread
+
+    logger = FixLogger('.', verbosity={'0': OFF, 'i': SUMMARY})
+    logger.log(raw_message)
+    logger.close()
+
+"""
+
+OFF = 0
+RAW = 1
+SUMMARY = 2
+
+RING_BYTES = 16 * 1024 * 1024
+RING_MESSAGES = 65536
+FLUSH_SECONDS = 0.2
+LOG_NAME_FORMAT = '%Y%m%d-%H00_quote.log'
+NS_PER_SECOND = 1000000000
+
+
+def summary(msg_type, raw):
+    # One line for the console: top of the first quote set of a Mass Quote, the entries
+    # of a Full Refresh, the fields of anything else.
+    pairs = tokenize(raw)
+    if msg_type == 'i':
+        for symbol, entries in quote_sets(pairs):
+            if entries:
+                level, bid, ask, bid_size, ask_size = entries[0]
+                return f'Mass Quote {symbol}: Bid: {bid}, Bid size: {bid_size}, Ask: {ask}, Ask size: {ask_size}'
+        return 'Mass Quote'
+    if msg_type == 'W':
+        symbols, entries = md_entries(pairs)
+        bids = [(price, size) for entry_type, level, price, size in entries if entry_type == 0]
+        asks = [(price, size) for entry_type, level, price, size in entries if entry_type == 1]
+        return f'Market Data {symbols}: Bids: {bids}, Asks: {asks}'
+    return '|'.join(f'{tag}={value}' for tag, value in pairs)
+
+
+class FixLogger:
+    def __init__(self, directory='.', verbosity=None, default_verbosity=RAW, ring_bytes=RING_BYTES,
+                 ring_messages=RING_MESSAGES, flush_seconds=FLUSH_SECONDS, name_format=LOG_NAME_FORMAT,
+                 name_timezone=None, summary_stream=None):
+        self.directory = directory
+        self.verbosity = {msg_type.encode(): level for msg_type, level in (verbosity or {}).items()}
+        self.default_verbosity = default_verbosity
+        self.flush_seconds = flush_seconds
+        self.name_format = name_format
+        self.name_timezone = name_timezone  # tzinfo, None for the local time.
+        self.summary_stream = summary_stream or sys.stdout
+        self.dropped = 0
+        self.written = 0
+
+        # Ring: message k is ring[starts[k % n]:starts[k % n] + lengths[k % n]]. Only the
+        # receive thread moves _head (published messages) and _position, only the writer
+        # thread moves _tail (written messages).
+        self._ring = bytearray(ring_bytes)
+        self._view = memoryview(self._ring)
+        self._ring_bytes = ring_bytes
+        self._starts = array('q', bytes(8 * ring_messages))
+        self._lengths = array('q', bytes(8 * ring_messages))
+        self._times = array('q', bytes(8 * ring_messages))
+        self._levels = array('b', bytes(ring_messages))
+        self._head = 0
+        self._tail = 0
+        self._position = 0
+
+        self._file = None
+        self._hour_start = self._hour_end = 0
+        self._second = None
+        self._second_prefix = b''
+        self._wake = threading.Event()
+        self._closing = False
+        self._thread = threading.Thread(target=self._writer, name='FixLogger', daemon=True)
+        self._thread.start()
+
+    def log(self, raw, time_ns=None, msg_type=None):
+        # Called by the receive thread. Returns False if the message was not kept.
+        # raw can be a memoryview (fix_receiver) if its msg_type (bytes) is given.
+        if msg_type is None:
+            start = raw.find(b'\x0135=') + 4
+            msg_type = raw[start:raw.find(b'\x01', start)] if start > 3 else b''
+        level = self.verbosity.get(msg_type, self.default_verbosity)
+        if level == OFF:
+            return False
+
+        size = len(raw)
+        head, tail = self._head, self._tail
+        starts = self._starts
+        n_slots = len(starts)
+        position = self._position
+        # Contiguous room for size bytes, before the oldest message not written yet.
+        if head == tail:
+            if position + size > self._ring_bytes:
+                position = 0
+            fits = size <= self._ring_bytes
+        elif head - tail >= n_slots:
+            fits = False
+        else:
+            oldest = starts[tail % n_slots]
+            if position < oldest:
+                fits = position + size < oldest
+            elif position + size <= self._ring_bytes:
+                fits = True
+            else:
+                position = 0
+                fits = size < oldest
+        if not fits:
+            self.dropped += 1
+            self._wake.set()
+            return False
+
+        self._view[position:position + size] = raw
+        slot = head % n_slots
+        starts[slot] = position
+        self._lengths[slot] = size
+        self._times[slot] = time.time_ns() if time_ns is None else time_ns
+        self._levels[slot] = level
+        self._position = position + size
+        self._head = head + 1  # published: the writer can read it now.
+        if head - tail > n_slots >> 1:
+            self._wake.set()
+        return True
+
+    def _open(self, time_ns):
+        # File of the hour of time_ns.
+        if self._file is not None:
+            self._file.close()
+        hour = datetime.fromtimestamp(time_ns // NS_PER_SECOND, timezone.utc).astimezone(self.name_timezone)
+        hour = hour.replace(minute=0, second=0, microsecond=0)
+        self._hour_start = int(hour.timestamp()) * NS_PER_SECOND
+        self._hour_end = int((hour + timedelta(hours=1)).timestamp()) * NS_PER_SECOND
+        self._file = open(os.path.join(self.directory, hour.strftime(self.name_format)), 'ab')
+
+    def _line_prefix(self, time_ns):
+        # b'YYYY-MM-DD HH:MM:SS.fff|' in UTC, the date and time formatted once per second.
+        second, ns = divmod(time_ns, NS_PER_SECOND)
+        if second != self._second:
+            self._second = second
+            self._second_prefix = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(second)).encode()
+        return b'%s.%03d|' % (self._second_prefix, ns // 1000000)
+
+    def _flush(self):
+        # Writes the published messages in one write per file, then frees their room.
+        head = self._head
+        tail = self._tail
+        if head == tail:
+            return
+        n_slots = len(self._starts)
+        ring = self._ring
+        batch = []
+        summaries = []
+        for k in range(tail, head):
+            slot = k % n_slots
+            time_ns = self._times[slot]
+            if self._file is None or not self._hour_start <= time_ns < self._hour_end:
+                if batch:
+                    self._file.write(b''.join(batch))
+                    batch = []
+                self._open(time_ns)
+            start = self._starts[slot]
+            raw = bytes(ring[start:start + self._lengths[slot]])
+            batch.append(self._line_prefix(time_ns) + raw + b'\n')
+            if self._levels[slot] == SUMMARY:
+                summaries.append(raw)
+        self._tail = head  # the room of the copied messages can be reused.
+        if batch:
+            self._file.write(b''.join(batch))
+            self._file.flush()
+        self.written += head - tail
+
+        for raw in summaries:
+            start = raw.find(b'\x0135=') + 4
+            msg_type = raw[start:raw.find(b'\x01', start)].decode()
+            print(summary(msg_type, raw), file=self.summary_stream)
+
+    def _writer(self):
+        while not self._closing:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self._flush()
+        self._flush()
+
+    def close(self):
+        # Writes what is left in the ring and closes the file.
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    from synthetic_log import generate_log
+
+    # Logs the messages of a synthetic log as if they had just been received.
+    generate_log('synthetic_quote.log', n_messages=10000, n_symbols=5)
+    with open('synthetic_quote.log', 'rb') as log_file:
+        messages = [line.rstrip(b'\n').split(b'|', 1)[1] for line in log_file]
+
+    with FixLogger('.', verbosity={'W': SUMMARY}) as logger:
+        start = time.perf_counter()
+        for raw in messages:
+            logger.log(raw)
+        seconds = time.perf_counter() - start
+    print(f'{len(messages)} messages in {seconds * 1e6 / len(messages):.2f} us each, {logger.dropped} dropped')
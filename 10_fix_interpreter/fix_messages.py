@@ -0,0 +1,89 @@
+import simplefix
+import configparser
+from datetime import datetime as dt
+
+
+"""
+
+Session configuration and outgoing FIX messages, without GUI or socket code, for
+the live interpreters (FIX_Connection) and the asyncio session engine (fix_sessions).
+
+    config = load_config('myconfig.cfg')
+    logon = create_fix_message('A', config['sender_comp_id'], config['target_comp_id'], 1, _108=30)
+    s.sendall(logon.encode())
+
+"""
+
+def load_config(config_file):
+    # Load the configuration in the config instance.
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(config_file)
+
+    # Create a dictionary with the configuration options.
+    config_data = {
+        "sender_comp_id": config.get("DEFAULT", 
+                                     "SenderCompID"),
+        "target_comp_id": config.get("DEFAULT", 
+                                     "TargetCompID"),
+        "host": config.get("DEFAULT", "SocketConnectHost"),
+        "port": config.getint("DEFAULT", "SocketConnectPort"),
+        "heartbeat_interval": config.getint("DEFAULT", 
+                                            "HeartBtInt"),
+        "username": config.get("LOGIN", "Username"),
+        "password": config.get("LOGIN", "Password"),
+        "session_start": config.get("SESSION", "Start"),
+        "session_end": config.get("SESSION", "End"),
+        "timezone": config.get("SESSION", "TimeZone"),
+    }
+
+    return config_data
+
+def create_fix_message(msg_type, sender_comp_id, 
+                       target_comp_id, 
+                       sequence_number,
+                       symbols=None,
+                       **kwargs):
+    # This function creates a new FIX message.
+    # It takes as inputs the message type, sender and 
+    # target company IDs, sequence number, a list 
+    # of symbols.
+    # After that, we can specify any number of FIX tags.
+
+    # First of all, we create an empty FIX message.
+    # We append the tags that are common to all the
+    # FIX messages. These tags are:
+    # - 8: FIX version
+    # - 9: Body length
+    # - 35: Message type
+    # - 34: Sequence number
+    msg = simplefix.FixMessage()
+    msg.append_pair(8, "FIX.4.4")
+    msg.append_pair(9, None) # Body length
+    msg.append_pair(35, msg_type)
+    msg.append_pair(34, sequence_number)
+    msg.append_pair(49, sender_comp_id)
+    msg.append_pair(56, target_comp_id)
+    msg.append_pair(52, dt.utcnow().strftime("%Y%m%d-%H:%M:%S.%f")[:-3])
+
+    # After that, we include in the FIX message the tags
+    # specified in the 
+    # kwargs dictionary.
+    for tag, value in kwargs.items():
+        msg.append_pair(int(tag[1:]), value) #msg.append_pair(int(tag), value)
+
+    # If we want to send a market data subscription message,
+    # we need to include the symbols for which we want to
+    # receive market data.
+    if symbols and msg_type == "V":
+        msg.append_pair(146, str(len(symbols)))  # Añadir el número de símbolos con el tag 146
+        for symbol in symbols:
+            msg.append_pair(55, symbol)
+
+    # Finally, we need to append the checksum tag (tag 10).
+    # This tag is calculated as the modulo 256 sum of 
+    # all the characters in the message, excluding the 
+    # checksum tag itself.
+    # We append it empty and it will be filled afterwards.
+    msg.append_pair(10, None)
+    return msg
@@ -0,0 +1,140 @@
+import os
+import socket
+
+
+"""
+
+Receive path of the live FIX sessions without a copy per message.
+
+The socket is read with recv_into into one bytearray allocated for the connection,
+and the messages are framed on BodyLength (9) directly in it:
+
+    8=FIX.4.4 \x01 9=NNN \x01 <NNN bytes of body, 35=... first> 10=CCC \x01
+
+Every complete message comes out as (MsgType, memoryview of its bytes in the buffer),
+which fix_tokenizer.tokenize and FixLogger.log read as they are. The views are only
+valid until the next recv: decode or log them before reading more.
+
+The buffer is never shifted per message: the unread tail is moved to the front only
+when fewer than min_recv bytes are left at the end (and for free when everything has
+been read), and the buffer grows only for a message longer than itself.
+
+    receiver = FixReceiver(s)
+    for msg_type, frame in receiver.messages():
+        if msg_type == b'i':
+            quote_sets(tokenize(frame))
+
+"""
+
+BUFFER_SIZE = 1024 * 1024
+MIN_RECV = 64 * 1024
+CHECKSUM_LENGTH = 7  # 10=NNN\x01
+
+
+class FixReceiver:
+    def __init__(self, sock, buffer_size=BUFFER_SIZE, min_recv=MIN_RECV):
+        self.sock = sock
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.min_recv = min(min_recv, buffer_size)
+        self.start = 0  # first byte not framed yet.
+        self.end = 0  # end of the received bytes.
+        self.compactions = 0
+        self.skipped = 0  # bytes discarded looking for a BeginString.
+
+    def _make_room(self):
+        if self.start == self.end:
+            self.start = self.end = 0
+            return
+        if len(self.buffer) - self.end >= self.min_recv:
+            return
+        pending = self.end - self.start
+        if pending + self.min_recv > len(self.buffer):
+            # A message longer than the buffer: a bigger one, the old views stay valid.
+            buffer = bytearray(2 * len(self.buffer))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer, self.view = buffer, memoryview(buffer)
+        else:
+            self.view[:pending] = self.view[self.start:self.end]
+        self.start, self.end = 0, pending
+        self.compactions += 1
+
+    def recv(self):
+        # Reads what the socket has into the buffer. Returns the number of bytes, 0 when closed.
+        self._make_room()
+        n = self.sock.recv_into(self.view[self.end:])
+        self.end += n
+        return n
+
+    def frames(self):
+        # Yields (MsgType as bytes, memoryview) of the complete messages received so far.
+        buffer, view = self.buffer, self.view
+        end = self.end
+        start = self.start
+        while True:
+            begin = buffer.find(b'8=FIX', start, end)
+            if begin < 0:
+                # Keep a possible partial BeginString at the end.
+                keep = max(start, end - 4)
+                self.skipped += keep - start
+                start = keep
+                break
+            self.skipped += begin - start
+            start = begin
+
+            length_start = buffer.find(b'\x019=', begin, end)
+            if length_start < 0:
+                break
+            length_end = buffer.find(b'\x01', length_start + 3, end)
+            if length_end < 0:
+                break
+            body_length = buffer[length_start + 3:length_end]
+            if not body_length.isdigit():
+                start = begin + 1  # not a message: look for the next BeginString.
+                continue
+            message_end = length_end + 1 + int(body_length) + CHECKSUM_LENGTH
+            if message_end > end:
+                break
+            if buffer[message_end - CHECKSUM_LENGTH:message_end - 4] != b'10=':
+                start = begin + 1  # BodyLength does not end at the checksum.
+                continue
+
+            type_start = length_end + 4  # after '35='
+            msg_type = bytes(view[type_start:buffer.find(b'\x01', type_start, message_end)])
+            start = message_end
+            self.start = start
+            yield msg_type, view[begin:message_end]
+        self.start = start
+
+    def messages(self):
+        # Frames of the connection until it closes.
+        while self.recv():
+            yield from self.frames()
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    import time
+    from threading import Thread
+    from synthetic_log import generate_log
+    from fix_tokenizer import tokenize
+
+    # Frames a synthetic log sent over a local socket pair.
+    generate_log('synthetic_quote.log', n_messages=100000, n_symbols=10)
+    with open('synthetic_quote.log', 'rb') as log_file:
+        stream = b''.join(line.rstrip(b'\n').split(b'|', 1)[1] for line in log_file)
+
+    sender, receiving = socket.socketpair()
+    Thread(target=lambda: (sender.sendall(stream), sender.close()), daemon=True).start()
+
+    start = time.perf_counter()
+    receiver = FixReceiver(receiving)
+    n_messages = 0
+    for msg_type, frame in receiver.messages():
+        tokenize(frame)
+        n_messages += 1
+    seconds = time.perf_counter() - start
+    print(f'{n_messages} messages in {seconds:.2f}s, {receiver.compactions} compactions')
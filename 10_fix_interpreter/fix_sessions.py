@@ -0,0 +1,251 @@
+import os
+import time
+import signal
+import asyncio
+
+from fix_messages import load_config, create_fix_message
+from fix_tokenizer import tokenize, get_field
+
+
+"""
+
+asyncio engine running many FIX sessions (pricing, trading, several providers) on one
+event loop, instead of one blocking socket and one reader thread per connection.
+
+Every FixSession is built from a load_config config (myconfig.cfg) and:
+
+    - reads with a StreamReader, framing every message on BodyLength (9): one
+      readuntil for the header and one readexactly for the body and checksum,
+    - writes without blocking (StreamWriter.write, drained by the heartbeat timer),
+    - sends Heartbeat (35=0) after HeartBtInt seconds without sending, a TestRequest
+      (35=1) after HeartBtInt seconds without receiving and drops the connection if
+      that is not answered, answers the TestRequests of the counterparty,
+    - awaits the callbacks registered with on(msg_type, callback) with
+      (session, msg_type, pairs, raw): pairs is the fix_tokenizer.tokenize list of
+      the message (quote_sets / md_entries read it), raw the message bytes,
+    - logs out (35=5) and closes cleanly on stop, and reconnects after
+      reconnect_seconds if the connection is lost.
+
+    engine = SessionEngine([FixSession(load_config('myconfig.cfg'), symbols=['EUR/USD'])])
+    engine.sessions[0].on('i', on_mass_quote)
+    asyncio.run(engine.run())      # Ctrl+C logs every session out
+
+"""
+
+SOH = b'\x01'
+CHECKSUM_LENGTH = 7  # 10=NNN\x01
+RECONNECT_SECONDS = 5.0
+LOGOUT_SECONDS = 2.0
+ADMIN_TYPES = {'0', '1', '2', '4', '5', 'A'}
+
+
+class FixSession:
+    def __init__(self, config, name=None, symbols=(), depth=5, reconnect_seconds=RECONNECT_SECONDS, logger=None):
+        self.config = config
+        self.logger = logger  # fix_logger.FixLogger of the received messages.
+        self.name = name or f"{config['sender_comp_id']}->{config['target_comp_id']}"
+        self.symbols = list(symbols)
+        self.depth = depth
+        self.reconnect_seconds = reconnect_seconds
+        self.heartbeat_interval = config['heartbeat_interval']
+        self.handlers = {}  # msg_type: [async callback]
+        self.seq = 1
+        self.reader = None
+        self.writer = None
+        self.logged_on = asyncio.Event()
+        self.messages_received = 0
+        self._stopping = False
+        self._last_sent = 0.0
+        self._last_received = 0.0
+        self._test_request = None  # TestReqID (112) waiting for its Heartbeat.
+
+    def on(self, msg_type, callback):
+        # Registers an async callback(session, msg_type, pairs, raw). msg_type '*' gets every message.
+        self.handlers.setdefault(msg_type, []).append(callback)
+        return callback
+
+    def send(self, msg_type, symbols=None, **fields):
+        # Queues a message on the writer, without blocking. The fields are given as in
+        # create_fix_message (_108=30).
+        message = create_fix_message(msg_type, self.config['sender_comp_id'], self.config['target_comp_id'],
+                                     self.seq, symbols, **fields)
+        self.writer.write(message.encode())
+        self.seq += 1
+        self._last_sent = time.monotonic()
+
+    def _logon(self):
+        self.send('A', _98='0', _108=self.heartbeat_interval, _141='Y',
+                  _553=self.config['username'], _554=self.config['password'])
+
+    def _subscribe(self):
+        # Snapshot + updates (263=1) of Bid and Ask (267=2) for the symbols of the session.
+        if self.symbols:
+            self.send('V', symbols=self.symbols, _141='N', _262=self.seq, _263='1', _264=str(self.depth), _267='2')
+
+    async def _read_message(self):
+        # One message, framed on BodyLength: '8=FIX.4.4\x01' '9=NNN\x01' then body and checksum.
+        header = await self.reader.readuntil(SOH + b'9=')
+        body_length = await self.reader.readuntil(SOH)
+        rest = await self.reader.readexactly(int(body_length[:-1]) + CHECKSUM_LENGTH)
+        start = header.rfind(b'8=')
+        if start < 0:
+            raise ConnectionError(f'{self.name}: no BeginString before BodyLength: {header[:40]!r}')
+        return header[start:] + body_length + rest
+
+    async def _dispatch(self, msg_type, pairs, raw):
+        for callback in self.handlers.get(msg_type, ()):
+            await callback(self, msg_type, pairs, raw)
+        for callback in self.handlers.get('*', ()):
+            await callback(self, msg_type, pairs, raw)
+
+    async def _read_loop(self):
+        while True:
+            raw = await self._read_message()
+            self._last_received = time.monotonic()
+            if self.logger is not None:
+                self.logger.log(raw)
+            self.messages_received += 1
+            pairs = tokenize(raw)
+            msg_type = pairs[2][1] if len(pairs) > 2 and pairs[2][0] == '35' else get_field(pairs, '35')
+
+            if msg_type in ADMIN_TYPES:
+                if msg_type == 'A':
+                    self.logged_on.set()
+                elif msg_type == '1':
+                    self.send('0', _112=get_field(pairs, '112'))
+                elif msg_type == '0' and self._test_request is not None and get_field(pairs, '112') == self._test_request:
+                    self._test_request = None
+                elif msg_type == '5':
+                    if not self._stopping:
+                        print(f'{self.name}: logout received: {get_field(pairs, "58")}')
+                        self.send('5')
+                    await self._dispatch(msg_type, pairs, raw)
+                    return
+            await self._dispatch(msg_type, pairs, raw)
+
+    async def _heartbeat_loop(self):
+        interval = self.heartbeat_interval
+        while True:
+            await asyncio.sleep(min(1.0, interval / 4))
+            await self.writer.drain()
+            now = time.monotonic()
+            if now - self._last_sent >= interval:
+                self.send('0')
+            if self._test_request is not None:
+                if now - self._last_received > 2 * interval:
+                    raise ConnectionError(f'{self.name}: TestRequest {self._test_request} not answered')
+            elif now - self._last_received > interval + 1:
+                self._test_request = str(self.seq)
+                self.send('1', _112=self._test_request)
+
+    async def _session(self):
+        self.reader, self.writer = await asyncio.open_connection(self.config['host'], self.config['port'])
+        if self._stopping:
+            self.writer.close()
+            return
+        self.seq = 1
+        self._last_received = time.monotonic()
+        self._test_request = None
+        self._logon()
+        self._subscribe()
+        await self.writer.drain()
+
+        reader = asyncio.create_task(self._read_loop())
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            done, pending = await asyncio.wait((reader, heartbeat), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # re-raises the error that ended the session.
+        finally:
+            reader.cancel()
+            heartbeat.cancel()
+            self.logged_on.clear()
+            self.writer.close()
+
+    async def run(self):
+        # Runs the session until stop(), reconnecting after reconnect_seconds.
+        while not self._stopping:
+            try:
+                await self._session()
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as error:
+                if self._stopping:
+                    break
+                print(f'{self.name}: {type(error).__name__} {error}, reconnecting in {self.reconnect_seconds}s')
+            if not self._stopping:
+                await asyncio.sleep(self.reconnect_seconds)
+
+    async def stop(self, timeout=LOGOUT_SECONDS):
+        # Sends Logout (35=5) and waits up to timeout for the reply before closing.
+        self._stopping = True
+        if self.writer is None or self.writer.is_closing():
+            return
+        replied = asyncio.Event()
+
+        async def on_logout(session, msg_type, pairs, raw):
+            replied.set()
+
+        self.on('5', on_logout)
+        self.send('5')
+        try:
+            await self.writer.drain()
+            await asyncio.wait_for(replied.wait(), timeout)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        self.writer.close()
+
+
+class SessionEngine:
+    # Runs its sessions on the current event loop. SIGINT / SIGTERM stop them cleanly.
+
+    def __init__(self, sessions=()):
+        self.sessions = list(sessions)
+
+    def add(self, session):
+        self.sessions.append(session)
+        return session
+
+    async def stop(self):
+        await asyncio.gather(*(session.stop() for session in self.sessions))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopping = []
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, lambda: stopping.append(asyncio.create_task(self.stop())))
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows, or not the main thread.
+        try:
+            await asyncio.gather(*(session.run() for session in self.sessions))
+        finally:
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.remove_signal_handler(signal_number)
+                except (NotImplementedError, RuntimeError):
+                    pass
+            if stopping:
+                await asyncio.gather(*stopping)
+
+
+def load_sessions(config_files, symbols=(), depth=5):
+    # One FixSession per load_config file.
+    return [FixSession(load_config(config_file), symbols=symbols, depth=depth) for config_file in config_files]
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    from fix_tokenizer import quote_sets
+
+    async def print_top(session, msg_type, pairs, raw):
+        for symbol, entries in quote_sets(pairs):
+            if entries:
+                level, bid, ask, bid_size, ask_size = entries[0]
+                print(f'{session.name} {symbol}: {bid} / {ask}')
+
+    engine = SessionEngine(load_sessions(['myconfig.cfg'], symbols=['EUR/USD']))
+    for session in engine.sessions:
+        session.on('i', print_top)
+    asyncio.run(engine.run())
@@ -0,0 +1,86 @@
+"""
+
+Single pass tokenizer for FIX messages.
+
+tokenize splits a message on SOH (\x01) once and the group readers walk the
+resulting (tag, value) pairs once more, emitting the repeating groups with typed
+values. This replaces the re.split / re.search per field of the log parsers.
+
+    35=i Mass Quote:  [(QuoteSetID (302), [(level (299), bid (188), ask (190), bid size (134), ask size (135)), ...]), ...]
+    35=W Full Refresh: ({Symbol (55) / MDReqID (262)}, [(entry type (269), level (299), price (270), size (271)), ...])
+
+Missing fields are None.
+
+"""
+
+SOH = '\x01'
+
+
+def tokenize(fix_message):
+    # (tag, value) pairs as strings. Accepts str, bytes, bytearray or memoryview.
+    if not isinstance(fix_message, str):
+        fix_message = str(fix_message, 'latin-1')
+    pairs = []
+    for field in fix_message.split(SOH):
+        tag, sep, value = field.partition('=')
+        if sep:
+            pairs.append((tag, value))
+    return pairs
+
+
+def get_field(pairs, tag):
+    # First value of tag, or None.
+    for pair_tag, value in pairs:
+        if pair_tag == tag:
+            return value
+    return None
+
+
+def quote_sets(pairs):
+    # Quote sets of a 35=i Mass Quote.
+    sets = []
+    entries = None
+    entry = None
+    for tag, value in pairs:
+        if tag == '302':
+            entries = []
+            entry = None
+            sets.append((value, entries))
+        elif entries is None:
+            continue
+        elif tag == '299':
+            entry = [int(value), None, None, None, None]
+            entries.append(entry)
+        elif entry is None:
+            continue
+        elif tag == '188':
+            entry[1] = float(value)
+        elif tag == '190':
+            entry[2] = float(value)
+        elif tag == '134':
+            entry[3] = float(value)
+        elif tag == '135':
+            entry[4] = float(value)
+    return [(symbol, [tuple(entry) for entry in entries]) for symbol, entries in sets]
+
+
+def md_entries(pairs):
+    # Symbols and entries of a 35=W Market Data - Snapshot/Full Refresh.
+    symbols = set()
+    entries = []
+    entry = None
+    for tag, value in pairs:
+        if tag == '269':
+            entry = [int(value) if value.isdigit() else None, None, None, None]
+            entries.append(entry)
+        elif tag == '55' or tag == '262':
+            symbols.add(value)
+        elif entry is None:
+            continue
+        elif tag == '299':
+            entry[1] = int(value)
+        elif tag == '270':
+            entry[2] = float(value)
+        elif tag == '271':
+            entry[3] = float(value)
+    return symbols, [tuple(entry) for entry in entries]
@@ -1,59 +1,30 @@
+import time
 import streamlit as st
-import re
 from datetime import datetime
-
-def parse_fix_log_v9(file_path, target_symbol, target_time):
-    liquidity_book = {level: {'Bid': 0, 'Ask': 0, 'Bid Size': 0, 'Ask Size': 0} for level in range(5)}
+from book_timeline import TimelineCache, book_from_timeline
+from liquidity_book import sort_liquidity_book
+from replay_cursor import BookReplayCursor
+from log_time import NS_PER_MS, ns_to_datetime
+
+# Streamlit reruns the script on every slider move. One TimelineCache is shared by
+# the reruns and sessions: the timeline of every file/symbol pair is built once,
+# extended with the new lines when the log grows, and the least recently used ones
+# are dropped beyond TIMELINE_CACHE_BYTES of arrays.
+@st.cache_resource
+def timeline_cache():
+    return TimelineCache()
+
+def parse_fix_log_v9(file_path, target_symbol, target_time, store_path=None):
     target_time_obj = datetime.strptime(target_time, '%Y-%m-%d %H:%M:%S.%f')
 
-    with open(file_path, 'r') as file:
-        for line in file:
-            msg_time = datetime.strptime(line.split('|')[0], '%Y-%m-%d %H:%M:%S.%f')
-            if msg_time > target_time_obj:
-                break
-
-            symbol_chunks = re.split(r'(302=[A-Z0-9_]+\x01)', line)
-            for i in range(1, len(symbol_chunks), 2):
-                if target_symbol in symbol_chunks[i]:
-                    level_content = symbol_chunks[i] + symbol_chunks[i+1]
-
-                    level_match = re.search(r'299=([\d.]+)\x01', level_content)
-                    level = int(level_match.group(1))
-
-                    bid_match = re.search(r'188=([\d.]+)\x01', level_content)
-                    ask_match = re.search(r'190=([\d.]+)\x01', level_content)
-                    bid_size_match = re.search(r'134=([\d.]+)\x01', level_content)
-                    ask_size_match = re.search(r'135=([\d.]+)\x01', level_content)
-
-                    if bid_match:
-                        liquidity_book[level]['Bid'] = float(bid_match.group(1))
-                    if ask_match:
-                        liquidity_book[level]['Ask'] = float(ask_match.group(1))
-                    if bid_size_match:
-                        liquidity_book[level]['Bid Size'] = int(bid_size_match.group(1))
-                    if ask_size_match:
-                        liquidity_book[level]['Ask Size'] = int(ask_size_match.group(1))
-
-                    
-                     # Reorder Bid and Bid Size columns
-                    for l in reversed(range(5)):
-                        # Reorder Bid and Bid Size columns
-                        for i in range(l, 0, -1):
-                            if liquidity_book[i]['Bid'] > liquidity_book[i - 1]['Bid']:
-                                liquidity_book[i]['Bid'], liquidity_book[i - 1]['Bid'] = liquidity_book[i - 1]['Bid'], liquidity_book[i]['Bid']
-                                liquidity_book[i]['Bid Size'], liquidity_book[i - 1]['Bid Size'] = liquidity_book[i - 1]['Bid Size'], liquidity_book[i]['Bid Size']
-                            else:
-                                break
-
-                        # Reorder Ask and Ask Size columns
-                        for i in range(l, 0, -1):
-                            if liquidity_book[i]['Ask'] < liquidity_book[i - 1]['Ask']:
-                                liquidity_book[i]['Ask'], liquidity_book[i - 1]['Ask'] = liquidity_book[i - 1]['Ask'], liquidity_book[i]['Ask']
-                                liquidity_book[i]['Ask Size'], liquidity_book[i - 1]['Ask Size'] = liquidity_book[i - 1]['Ask Size'], liquidity_book[i]['Ask Size']
-                            else:
-                                break
-
-    return liquidity_book
+    if store_path is not None:
+        # The book is rebuilt from the tick store (tick_store.convert_log) instead of parsing file_path.
+        from tick_store import replay_store
+        liquidity_book = sort_liquidity_book(replay_store(store_path, target_symbol, target_time_obj, spreads=False)[0])
+    else:
+        timeline = timeline_cache().get(file_path, target_symbol)
+        liquidity_book = book_from_timeline(timeline, target_time_obj)
+    return {level: data for level, data in enumerate(liquidity_book)}
 
 st.title("Herramienta interactiva para visualizar el libro de liquidez")
 
@@ -67,16 +38,13 @@ seconds = st.slider("Segundos", 0, 59, 30)
 milliseconds = st.slider("Milisegundos", 0, 999, 0)
 
 target_time = f"2023-04-25 {hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
-liquidity_book = parse_fix_log_v9(file_path, target_symbol, target_time)
 
 st.subheader("Selecciona el símbolo objetivo")
 
 target_symbol = st.text_input("Símbolo objetivo", "EURUSD_0")
+liquidity_book = parse_fix_log_v9(file_path, target_symbol, target_time)
 
-# Crear un contenedor para la tabla y un marcador de posición
-with st.container():
-    table_placeholder = st.empty()
-
+def liquidity_table(liquidity_book):
     # Crear la tabla de liquidez
     liquidity_table = []
 
@@ -87,5 +55,35 @@ with st.container():
         formatted_bid = format(data["Bid"], ".5f")
         formatted_ask = format(data["Ask"], ".5f")
         liquidity_table.append([f"Level {level}", formatted_bid, formatted_ask, data["Bid Size"], data["Ask Size"]])
+    return liquidity_table
 
-    table_placeholder.table(liquidity_table)
\ No newline at end of file
+# Crear un contenedor para la tabla y un marcador de posición
+with st.container():
+    time_placeholder = st.empty()
+    table_placeholder = st.empty()
+    table_placeholder.table(liquidity_table(liquidity_book))
+
+# Reproducción paso a paso: el cursor guarda la posición en el log y el libro, así
+# que cada paso solo aplica los mensajes nuevos entre un fotograma y el siguiente.
+st.subheader("Reproducción")
+step_ms = st.number_input("Paso (ms)", 1, 60000, 100)
+frames = st.number_input("Pasos por reproducción", 1, 10000, 100)
+
+cursor_key = (file_path, target_symbol, target_time)
+if st.session_state.get("cursor_key") != cursor_key:
+    if "cursor" in st.session_state:
+        st.session_state["cursor"].close()
+    st.session_state["cursor"] = BookReplayCursor.at(file_path, target_time, symbols=[target_symbol])
+    st.session_state["cursor_key"] = cursor_key
+cursor = st.session_state["cursor"]
+
+step = st.button("Paso")
+play = st.button("Reproducir")
+if step or play:
+    for frame in range(frames if play else 1):
+        cursor.advance_to(cursor.time + step_ms * NS_PER_MS)
+        book = cursor.snapshot(target_symbol) or []
+        time_placeholder.write(f"Tiempo: {ns_to_datetime(cursor.time)}")
+        table_placeholder.table(liquidity_table({level: data for level, data in enumerate(book)}))
+        if play:
+            time.sleep(step_ms / 1000)
@@ -0,0 +1,252 @@
+from bisect import bisect_left, insort
+
+from fix_tokenizer import tokenize, quote_sets, md_entries
+
+
+"""
+
+Liquidity book shared by the log tools and the live interpreter.
+
+The book has n_depths slots addressed by the 299 (QuoteEntryID) level of the updates,
+stored as preallocated per side price/size lists. Every update re-inserts its slot in
+the bid and ask orders, so the sorted levels and the best bid/ask never need a full sort:
+
+    order of a side: quoted slots (price > 0 and size > 0) by price, best first, then
+                     the empty ones; slot number breaks the ties.
+
+"""
+
+class LiquidityBook:
+    __slots__ = ('n_depths', 'bid', 'ask', 'bid_size', 'ask_size', 'bid_order', 'ask_order', '_bid_keys', '_ask_keys')
+
+    def __init__(self, n_depths=5):
+        self.n_depths = n_depths
+        self.bid = [0.0] * n_depths
+        self.ask = [0.0] * n_depths
+        self.bid_size = [0.0] * n_depths
+        self.ask_size = [0.0] * n_depths
+        # Sort key (empty, signed price, slot) of every slot, and the keys in order.
+        self._bid_keys = [(1, 0.0, slot) for slot in range(n_depths)]
+        self._ask_keys = self._bid_keys[:]
+        self.bid_order = self._bid_keys[:]
+        self.ask_order = self._bid_keys[:]
+
+    def update_bid(self, level, price=None, size=None):
+        # None leaves the field as it is. A negative size cancels the quote.
+        prices, sizes = self.bid, self.bid_size
+        if price is not None:
+            prices[level] = price
+        if size is not None:
+            if size < 0:  # quote cancelled.
+                size = 0.0
+                prices[level] = 0.0
+            sizes[level] = size
+
+        price = prices[level]
+        key = (0, -price, level) if price > 0 and sizes[level] > 0 else (1, 0.0, level)
+        old_key = self._bid_keys[level]
+        if key != old_key:
+            order = self.bid_order
+            del order[bisect_left(order, old_key)]
+            insort(order, key)
+            self._bid_keys[level] = key
+
+    def update_ask(self, level, price=None, size=None):
+        prices, sizes = self.ask, self.ask_size
+        if price is not None:
+            prices[level] = price
+        if size is not None:
+            if size < 0:  # quote cancelled.
+                size = 0.0
+                prices[level] = 0.0
+            sizes[level] = size
+
+        price = prices[level]
+        key = (0, price, level) if price > 0 and sizes[level] > 0 else (1, 0.0, level)
+        old_key = self._ask_keys[level]
+        if key != old_key:
+            order = self.ask_order
+            del order[bisect_left(order, old_key)]
+            insort(order, key)
+            self._ask_keys[level] = key
+
+    def best_bid(self):
+        # Best quoted bid price, or None.
+        empty, price, slot = self.bid_order[0]
+        return None if empty else -price
+
+    def best_ask(self):
+        empty, price, slot = self.ask_order[0]
+        return None if empty else price
+
+    def top(self):
+        # (best bid, best ask), or None while one of the sides is empty.
+        bid = self.best_bid()
+        ask = self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return bid, ask
+
+    def quote(self):
+        # (best bid, best ask, bid size, ask size), or None while one of the sides is empty.
+        (bid_empty, _, bid_slot), (ask_empty, _, ask_slot) = self.bid_order[0], self.ask_order[0]
+        if bid_empty or ask_empty:
+            return None
+        return self.bid[bid_slot], self.ask[ask_slot], self.bid_size[bid_slot], self.ask_size[ask_slot]
+
+    def levels(self):
+        # Sorted levels as [{'Bid', 'Ask', 'Bid Size', 'Ask Size'}, ...], best first.
+        return [{'Bid': self.bid[b], 'Ask': self.ask[a], 'Bid Size': self.bid_size[b], 'Ask Size': self.ask_size[a]}
+                for (_, _, b), (_, _, a) in zip(self.bid_order, self.ask_order)]
+
+    def rows(self):
+        # Sorted levels as [[Bid, Ask, Bid Size, Ask Size], ...], for arrays.
+        return [[self.bid[b], self.ask[a], self.bid_size[b], self.ask_size[a]]
+                for (_, _, b), (_, _, a) in zip(self.bid_order, self.ask_order)]
+
+    def slots(self):
+        # Unsorted [Bid, Ask, Bid Size, Ask Size] of every slot, for checkpoints and arrays.
+        return [list(level) for level in zip(self.bid, self.ask, self.bid_size, self.ask_size)]
+
+    @classmethod
+    def from_slots(cls, slots):
+        book = cls(len(slots))
+        for level, (bid, ask, bid_size, ask_size) in enumerate(slots):
+            book.update_bid(level, bid, bid_size)
+            book.update_ask(level, ask, ask_size)
+        return book
+
+    def copy(self):
+        book = LiquidityBook.__new__(LiquidityBook)
+        book.n_depths = self.n_depths
+        book.bid, book.ask = self.bid[:], self.ask[:]
+        book.bid_size, book.ask_size = self.bid_size[:], self.ask_size[:]
+        book._bid_keys, book._ask_keys = self._bid_keys[:], self._ask_keys[:]
+        book.bid_order, book.ask_order = self.bid_order[:], self.ask_order[:]
+        return book
+
+    def __eq__(self, other):
+        if not isinstance(other, LiquidityBook):
+            return NotImplemented
+        return self.slots() == other.slots()
+
+    def __repr__(self):
+        return f'LiquidityBook({self.levels()})'
+
+
+def new_liquidity_book(n_depths=5):
+    return LiquidityBook(n_depths)
+
+
+def apply_quote_entries(liquidity_book, entries):
+    # Applies the (level, bid, ask, bid size, ask size) quote entries of one 302 quote set.
+    for level, bid, ask, bid_size, ask_size in entries:
+        if bid is not None or bid_size is not None:
+            liquidity_book.update_bid(level, bid, bid_size)
+        if ask is not None or ask_size is not None:
+            liquidity_book.update_ask(level, ask, ask_size)
+    return liquidity_book
+
+
+def apply_md_entries(liquidity_book, entries):
+    # Applies the (entry type, level, price, size) entries of a full refresh.
+    for entry_type, level, price, size in entries:
+        if level is None:
+            continue
+
+        if entry_type == 0:  # Bid
+            liquidity_book.update_bid(level, price, size)
+        elif entry_type == 1:  # Ask
+            liquidity_book.update_ask(level, price, size)
+    return liquidity_book
+
+
+# Mass Quote
+def parse_mass_quote(liquidity_book, line, target_symbol_str):
+    target_symbol = target_symbol_str[1:-1]
+
+    for symbol, entries in quote_sets(tokenize(line)):
+        if symbol == target_symbol:
+            apply_quote_entries(liquidity_book, entries)
+    return liquidity_book
+
+
+# Market Data - Snapshot/Full Refresh
+def parse_full_refresh(liquidity_book, line, target_symbol_str):
+    # print_fix(line)
+    if f'55{target_symbol_str}' not in line and f'262{target_symbol_str}' not in line:
+        return liquidity_book
+
+    symbols, entries = md_entries(tokenize(line))
+    return apply_md_entries(liquidity_book, entries)
+
+
+def apply_line(liquidity_book, line, target_symbol_str):
+    # Applies a 35=W or 35=i log line to the book. Returns False for other messages.
+    if '35=W' in line:
+        parse_full_refresh(liquidity_book, line, target_symbol_str)
+    elif '35=i' in line:
+        parse_mass_quote(liquidity_book, line, target_symbol_str)
+    else:
+        return False
+    return True
+
+
+def apply_message_all(books, msg_type, pairs, n_depths=5, symbols=None):
+    # Applies the tokenized pairs of a 'W' or 'i' message (msg_type as str) to the books
+    # of every symbol it updates (302 quote sets, 55/262 full refreshes), creating the
+    # books as needed. If symbols is given the others are skipped. Returns the updated symbols.
+    updated = []
+    if msg_type == 'W':
+        line_symbols, entries = md_entries(pairs)
+        for symbol in line_symbols:
+            if symbols is not None and symbol not in symbols:
+                continue
+            if symbol not in books:
+                books[symbol] = new_liquidity_book(n_depths)
+            apply_md_entries(books[symbol], entries)
+            updated.append(symbol)
+    elif msg_type == 'i':
+        for symbol, entries in quote_sets(pairs):
+            if symbols is not None and symbol not in symbols:
+                continue
+            if symbol not in books:
+                books[symbol] = new_liquidity_book(n_depths)
+            apply_quote_entries(books[symbol], entries)
+            updated.append(symbol)
+    return updated
+
+
+def apply_line_all(books, line, n_depths=5, symbols=None):
+    # apply_message_all of a 35=W or 35=i log line. Returns the updated symbols.
+    if '35=W' in line:
+        return apply_message_all(books, 'W', tokenize(line), n_depths, symbols)
+    if '35=i' in line:
+        return apply_message_all(books, 'i', tokenize(line), n_depths, symbols)
+    return []
+
+
+# Pip of the symbols that do not follow the JPY / 4 decimals rule, by symbol without the _N suffix.
+PIP_SIZES = {
+    'XAUUSD': 0.1,
+    'XAGUSD': 0.01,
+}
+
+
+def pip_size(symbol):
+    pip = PIP_SIZES.get(symbol.split('_', 1)[0])
+    if pip is not None:
+        return pip
+    if 'JPY' in symbol:
+        return 0.01
+    return 0.0001
+
+
+def top_of_book(liquidity_book):
+    # Best bid and ask with size, or None while one of the sides is empty.
+    return liquidity_book.top()
+
+
+def sort_liquidity_book(liquidity_book):
+    # Sorted levels of the book (the book itself keeps them sorted).
+    return liquidity_book.levels()
@@ -0,0 +1,310 @@
+import os
+import io
+import json
+import zlib
+import threading
+from queue import Queue, Full
+from bisect import bisect_right
+
+
+"""
+
+Plain and compressed quote logs (20230425-0800_quote.log, .log.gz, .log.zst) behind one reader.
+
+Offsets everywhere (time index, checkpoints, replays) are positions in the decompressed
+log, so the sidecars of a compressed log hold the same values as for the plain one.
+
+    open_log(file_path, offset)   buffered binary file positioned at offset
+    iter_chunks(file_path, ...)   blocks of complete lines, for the find/regex scanners
+    log_size(file_path)           decompressed size
+
+For a compressed log the decompression runs in a background thread that fills a
+bounded queue of chunks, so it overlaps with the parsing (zlib and zstandard release
+the GIL while they work).
+
+Seeking: a compressed log is a sequence of frames (gzip members, zstd frames) that
+decompress on their own. The frame table (.frames sidecar with the compressed and
+decompressed offset of every frame) is written by compress_log, or found with one
+pass over a log compressed by other tools. A seek decompresses from the frame holding
+the offset. A log compressed as a single frame still works, from its start.
+zstandard is only needed for .zst logs.
+
+"""
+
+COMPRESSED_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+FRAMES_SUFFIX = '.frames'
+FRAME_SIZE = 4 * 1024 * 1024  # decompressed bytes per frame written by compress_log.
+CHUNK_SIZE = 1024 * 1024
+QUEUE_CHUNKS = 8
+
+
+def compression(file_path):
+    return COMPRESSED_SUFFIXES.get(os.path.splitext(file_path)[1])
+
+
+def is_compressed(file_path):
+    return compression(file_path) is not None
+
+
+def frames_path(file_path):
+    return file_path + FRAMES_SUFFIX
+
+
+def _decompressobj(kind):
+    if kind == 'gzip':
+        return zlib.decompressobj(wbits=31)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _compress_frame(kind, data, level):
+    # One self-contained gzip member / zstd frame.
+    if kind == 'gzip':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    import zstandard
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _decompress(file, kind, stopping=None):
+    # Yields the decompressed chunks from the current position of file, across frames,
+    # as (compressed offset of the frame, decompressed bytes). A new frame starts with
+    # an empty chunk.
+    frame_offset = file.tell()
+    decompressor = _decompressobj(kind)
+    while stopping is None or not stopping.is_set():
+        data = file.read(CHUNK_SIZE)
+        if not data:
+            break
+        consumed = file.tell() - len(data)
+        while data:
+            out = decompressor.decompress(data)
+            if out:
+                yield frame_offset, out
+            if not decompressor.eof:
+                break
+            # End of frame: the rest of data is the next one.
+            consumed += len(data) - len(decompressor.unused_data)
+            data = decompressor.unused_data
+            decompressor = _decompressobj(kind)
+            frame_offset = consumed
+            if data or file.peek(1):
+                yield frame_offset, b''
+
+
+def _scan_frames(file_path, kind):
+    frames = [[0, 0]]
+    length = 0
+    with open(file_path, 'rb') as file:
+        for frame_offset, out in _decompress(file, kind):
+            if not out:
+                frames.append([frame_offset, length])
+            length += len(out)
+    return frames, length
+
+
+def load_frames(file_path):
+    # Frame table {'size', 'mtime_ns', 'length', 'frames': [[compressed offset, decompressed offset], ...]}
+    # of a compressed log, found once and stored next to it.
+    file_stat = os.stat(file_path)
+    try:
+        with open(frames_path(file_path), 'r') as frames_file:
+            table = json.load(frames_file)
+        if table['size'] == file_stat.st_size and table['mtime_ns'] == file_stat.st_mtime_ns:
+            return table
+    except (OSError, ValueError, KeyError):
+        pass
+
+    frames, length = _scan_frames(file_path, compression(file_path))
+    table = {'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns, 'length': length, 'frames': frames}
+    with open(frames_path(file_path), 'w') as frames_file:
+        json.dump(table, frames_file)
+    return table
+
+
+def log_size(file_path):
+    if is_compressed(file_path):
+        return load_frames(file_path)['length']
+    return os.path.getsize(file_path)
+
+
+def _put(queue, item, stopping):
+    while not stopping.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return
+        except Full:
+            pass
+
+
+def _producer(file_path, kind, start, queue, stopping):
+    try:
+        with open(file_path, 'rb') as file:
+            file.seek(start)
+            for frame_offset, out in _decompress(file, kind, stopping):
+                if out:
+                    _put(queue, out, stopping)
+        _put(queue, None, stopping)
+    except Exception as error:
+        _put(queue, error, stopping)
+
+
+class _DecompressedLog(io.RawIOBase):
+    # Raw reader over the decompressed log, fed by the background thread.
+
+    def __init__(self, file_path, offset=0):
+        self.file_path = file_path
+        self.kind = compression(file_path)
+        self.table = load_frames(file_path)
+        self._thread = None
+        self._start(offset)
+
+    def _start(self, offset):
+        self._stop()
+        frames = self.table['frames']
+        i = max(bisect_right(frames, offset, key=lambda frame: frame[1]) - 1, 0)
+        self._queue = Queue(QUEUE_CHUNKS)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=_producer, args=(self.file_path, self.kind, frames[i][0], self._queue, self._stopping), daemon=True)
+        self._thread.start()
+        self._pending = memoryview(b'')
+        self._eof = False
+        self._position = frames[i][1]
+        self._skip(offset - self._position)
+
+    def _stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def _skip(self, n):
+        while n > 0:
+            if not self._fill():
+                break
+            step = min(n, len(self._pending))
+            self._pending = self._pending[step:]
+            self._position += step
+            n -= step
+
+    def _fill(self):
+        while not self._pending and not self._eof:
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+            elif isinstance(chunk, Exception):
+                self._eof = True
+                raise chunk
+            else:
+                self._pending = memoryview(chunk)
+        return len(self._pending) > 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._fill():
+            return 0
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        self._position += n
+        return n
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.table['length']
+        # Forward inside the current frame: skip. Otherwise restart at the frame of offset.
+        frames = self.table['frames']
+        frame_start = frames[max(bisect_right(frames, offset, key=lambda frame: frame[1]) - 1, 0)][1]
+        if offset < self._position or frame_start > self._position:
+            self._start(offset)
+        else:
+            self._skip(offset - self._position)
+        return self._position
+
+    def close(self):
+        self._stop()
+        super().close()
+
+
+def open_log(file_path, offset=0):
+    # Binary file over the (decompressed) log, positioned at offset.
+    if not is_compressed(file_path):
+        file = open(file_path, 'rb')
+        file.seek(offset)
+        return file
+    return io.BufferedReader(_DecompressedLog(file_path, offset), buffer_size=CHUNK_SIZE)
+
+
+def iter_chunks(file_path, start_offset=0, end_offset=None, chunk_size=CHUNK_SIZE):
+    # Yields (offset, block) of [start_offset, end_offset): every block ends at a line
+    # boundary except the last one if the log ends with a partial line.
+    position = start_offset
+    tail = b''
+    with open_log(file_path, start_offset) as file:
+        while end_offset is None or position < end_offset:
+            size = chunk_size if end_offset is None else min(chunk_size, end_offset - position)
+            data = file.read(size)
+            if not data:
+                break
+            position += len(data)
+            data = tail + data
+            cut = data.rfind(b'\n') + 1
+            tail = data[cut:]
+            if cut:
+                yield position - len(data), data[:cut]
+    if tail:
+        yield position - len(tail), tail
+
+
+def compress_log(file_path, out_path=None, kind='gzip', frame_size=FRAME_SIZE, level=None):
+    # Compresses a plain log as frames of about frame_size bytes cut at line boundaries,
+    # readable by zcat / zstd -d, and writes its frame table.
+    if out_path is None:
+        out_path = file_path + {'gzip': '.gz', 'zstd': '.zst'}[kind]
+    if level is None:
+        level = 6 if kind == 'gzip' else 3
+
+    frames = []
+    length = 0
+    tail = b''
+    with open(file_path, 'rb') as file, open(out_path, 'wb') as out_file:
+        while True:
+            data = file.read(frame_size)
+            data = tail + data
+            if not data:
+                break
+            cut = data.rfind(b'\n') + 1 if len(data) > len(tail) else len(data)
+            if cut == 0:
+                cut = len(data)  # a line longer than the frame.
+            tail = data[cut:]
+            frames.append([out_file.tell(), length])
+            out_file.write(_compress_frame(kind, data[:cut], level))
+            length += cut
+
+    if not frames:
+        frames = [[0, 0]]
+    file_stat = os.stat(out_path)
+    with open(frames_path(out_path), 'w') as frames_file:
+        json.dump({'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns, 'length': length, 'frames': frames}, frames_file)
+    return out_path
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+
+    compressed_path = compress_log(file_path)
+    print(compressed_path, log_size(compressed_path), load_frames(compressed_path)['frames'][:5])
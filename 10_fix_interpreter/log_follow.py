@@ -0,0 +1,207 @@
+import os
+import re
+import time
+
+import plotly.graph_objects as go
+
+from log_files import CHUNK_SIZE
+from log_time import line_time_ns
+from liquidity_book import apply_line_all
+from spread_recorder import SpreadRecorder
+from spread_plot import PLOT_POINTS, spread_figure, window
+
+
+"""
+
+Follow mode: replay of the quote log the feed handler is still writing.
+
+    follow_lines(file_path)     lists of the complete lines appended to the log, as they come
+    follow_log(file_path)       the same one line at a time, for the log_pipeline stages
+    LiveSpreads                 books and Bid/Ask/Spread series updated batch by batch
+    follow_spreads(...)         follow_lines -> LiveSpreads -> on_update(live, symbols)
+
+The log stays open and is polled every poll_seconds once its end is reached. A
+partial trailing line is held back until its newline is written. When the next hourly
+log appears in the same directory (20230425-0800_quote.log -> 20230425-0900_quote.log)
+the rest of the current one is read and the replay moves on to the new file, with
+the same books. A log truncated under the reader is replayed again from its start.
+
+Memory stays bounded: lines are read CHUNK_SIZE bytes at a time and every spread
+series keeps its last max_points rows. The charts are downsampled (spread_plot):
+
+    live_widget(symbol)             FigureWidget redrawn after every update (notebook)
+    live_html(symbol, path)         HTML file rewritten at most every refresh_seconds,
+                                    the page reloads itself
+
+"""
+
+POLL_SECONDS = 0.5
+LIVE_POINTS = 200000
+REFRESH_SECONDS = 2.0
+HOURLY_LOG = re.compile(r'^\d{8}-\d{4}_quote\.log$')
+
+
+def next_log_path(file_path):
+    # The first hourly log after file_path in its directory (an hour without quotes
+    # has no file), None if there is none yet or file_path is not an hourly log.
+    directory, name = os.path.split(file_path)
+    if not HOURLY_LOG.match(name):
+        return None
+    later = sorted(other for other in os.listdir(directory or '.') if HOURLY_LOG.match(other) and other > name)
+    if not later:
+        return None
+    return os.path.join(directory, later[0])
+
+
+def _split_lines(tail, data):
+    # (complete decoded lines, partial tail) of tail + data.
+    data = tail + data
+    cut = data.rfind(b'\n') + 1
+    return data[:cut].decode().splitlines(keepends=True), data[cut:]
+
+
+def follow_lines(file_path, start_offset=0, poll_seconds=POLL_SECONDS, stop=None, rotate=True):
+    # Yields non-empty lists of complete lines (with their '\n') from start_offset
+    # (None: the current end of the log) and keeps waiting for more until stop
+    # (threading.Event) is set.
+    while stop is None or not stop.is_set():
+        with open(file_path, 'rb') as file:
+            if start_offset is None:
+                start_offset = file.seek(0, os.SEEK_END)
+            file.seek(start_offset)
+            position = start_offset
+            tail = b''
+            next_path = None
+            while stop is None or not stop.is_set():
+                data = file.read(CHUNK_SIZE)
+                if data:
+                    position += len(data)
+                    lines, tail = _split_lines(tail, data)
+                    if lines:
+                        yield lines
+                    continue
+
+                if os.path.getsize(file_path) < position:
+                    start_offset = 0  # truncated: read it again.
+                    break
+                if next_path is not None:
+                    # Everything written before the rotation is read: move on.
+                    if tail:
+                        yield [tail.decode()]
+                    file_path, start_offset = next_path, 0
+                    break
+                next_path = next_log_path(file_path) if rotate else None
+                if next_path is None:
+                    if stop is None:
+                        time.sleep(poll_seconds)
+                    else:
+                        stop.wait(poll_seconds)
+                # Else one more read for what the writer added before moving to next_path.
+
+
+def follow_log(file_path, start_offset=0, poll_seconds=POLL_SECONDS, stop=None, rotate=True):
+    # follow_lines one line at a time: read_log of log_pipeline for a live log.
+    for lines in follow_lines(file_path, start_offset, poll_seconds, stop, rotate):
+        yield from lines
+
+
+class LiveSpreads:
+    # Books ({symbol: LiquidityBook}) and spread series ({symbol: SpreadRecorder} of at
+    # most max_points rows) of the followed log.
+
+    def __init__(self, symbols=None, n_depths=5, max_points=LIVE_POINTS):
+        self.symbols = None if symbols is None else set(symbols)
+        self.n_depths = n_depths
+        self.max_points = max_points
+        self.books = {}
+        self.recorders = {}
+        self._needles = None
+        if symbols is not None:
+            self._needles = ["=" + symbol + '\x01' for symbol in symbols]
+
+    def update(self, lines):
+        # Applies the lines to the books and records the spreads. Returns the set of
+        # updated symbols.
+        changed = set()
+        for line in lines:
+            if self._needles is not None and not any(needle in line for needle in self._needles):
+                continue
+            updated = apply_line_all(self.books, line, self.n_depths, self.symbols)
+            if not updated:
+                continue
+            time_ns = line_time_ns(line)
+            for symbol in updated:
+                if symbol not in self.recorders:
+                    self.recorders[symbol] = SpreadRecorder(symbol)
+                self.recorders[symbol].record(self.books[symbol], time_ns)
+            changed.update(updated)
+
+        # Trimmed once the series is max_points over, so the copy is amortised.
+        for symbol in changed:
+            if len(self.recorders[symbol]) >= 2 * self.max_points:
+                self.recorders[symbol].trim(self.max_points)
+        return changed
+
+    def frame(self, symbol):
+        # Bid/Ask/Spread DataFrame of the last max_points (up to twice that) updates of symbol.
+        if symbol not in self.recorders:
+            return SpreadRecorder(symbol, capacity=1).to_frame()
+        return self.recorders[symbol].to_frame()
+
+
+def follow_spreads(file_path, symbols=None, on_update=None, start_offset=0, n_depths=5,
+                   max_points=LIVE_POINTS, poll_seconds=POLL_SECONDS, stop=None, rotate=True):
+    # Follows file_path and calls on_update(live, updated symbols) after every batch of
+    # lines. Returns the LiveSpreads once stop is set.
+    live = LiveSpreads(symbols, n_depths, max_points)
+    for lines in follow_lines(file_path, start_offset, poll_seconds, stop, rotate):
+        changed = live.update(lines)
+        if changed and on_update is not None:
+            on_update(live, changed)
+    return live
+
+
+def live_widget(symbol, n_points=PLOT_POINTS):
+    # (FigureWidget, on_update) of symbol for follow_spreads in a notebook: display the
+    # widget, then run follow_spreads in a thread.
+    fig = spread_figure(SpreadRecorder(symbol, capacity=1).to_frame(), symbol, n_points, figure=go.FigureWidget)
+
+    def on_update(live, changed):
+        if symbol not in changed:
+            return
+        with fig.batch_update():
+            for trace, (times, values) in zip(fig.data, window(live.frame(symbol), n_points=n_points).values()):
+                trace.x, trace.y = times, values
+
+    return fig, on_update
+
+
+def live_html(symbol, html_path, refresh_seconds=REFRESH_SECONDS, n_points=PLOT_POINTS):
+    # on_update writing the chart of symbol to html_path at most every refresh_seconds.
+    # The page reloads itself as often, so any browser shows the live spread.
+    last_write = [0.0]
+
+    def on_update(live, changed):
+        now = time.monotonic()
+        if symbol not in changed or now - last_write[0] < refresh_seconds:
+            return
+        last_write[0] = now
+        html = spread_figure(live.frame(symbol), symbol, n_points).to_html(include_plotlyjs='cdn')
+        html = html.replace('<head>', f'<head><meta http-equiv="refresh" content="{refresh_seconds:g}">', 1)
+        with open(html_path + '.tmp', 'w') as html_file:
+            html_file.write(html)
+        os.replace(html_path + '.tmp', html_path)
+
+    return on_update
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+    target_symbol = 'EURUSD_0'
+
+    # Open live_spread.html in a browser, Ctrl+C to stop.
+    follow_spreads(file_path, [target_symbol], live_html(target_symbol, 'live_spread.html'))
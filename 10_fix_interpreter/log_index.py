@@ -0,0 +1,121 @@
+import json
+from bisect import bisect_right
+
+from log_files import open_log, log_size
+from log_time import log_time_ns, line_time_ns, to_ns
+
+
+"""
+
+Sidecar time index for quote logs (20230425-0800_quote.log -> 20230425-0800_quote.log.idx).
+
+Every `stride` bytes the index stores the timestamp and byte offset of the first
+complete line, so a point-in-time query bisects the index and only checks the
+timestamps of one stride worth of lines instead of the whole file.
+The index is built once and extended when the log grows. Compressed logs work
+the same way, with offsets in the decompressed log (log_files).
+
+"""
+
+INDEX_SUFFIX = '.idx'
+INDEX_STRIDE = 256 * 1024
+LOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def index_path(file_path):
+    return file_path + INDEX_SUFFIX
+
+
+def _line_time(raw_line):
+    return raw_line.split(b'|', 1)[0].decode()
+
+
+def _index_from(file, index, start, file_size, stride):
+    # Adds one entry per stride boundary from `start` up to the last complete line.
+    boundary = start
+    while boundary < file_size:
+        if boundary > 0:
+            # Skip the rest of the line the boundary falls into.
+            file.seek(boundary - 1)
+            file.readline()
+        offset = file.tell()
+        raw_line = file.readline()
+        if not raw_line.endswith(b'\n'):
+            break  # partial trailing line, it is indexed once it is complete.
+        if not index['offsets'] or offset > index['offsets'][-1]:
+            index['times'].append(_line_time(raw_line))
+            index['offsets'].append(offset)
+        boundary = max(boundary + stride, offset + 1)
+
+    # The indexed size always ends on a line boundary.
+    file.seek(index['offsets'][-1] if index['offsets'] else start)
+    size = file.tell()
+    for raw_line in file:
+        if raw_line.endswith(b'\n'):
+            size += len(raw_line)
+    index['size'] = size
+    return index
+
+
+def build_index(file_path, stride=INDEX_STRIDE):
+    index = {'size': 0, 'stride': stride, 'times': [], 'offsets': []}
+    file_size = log_size(file_path)
+    with open_log(file_path) as file:
+        _index_from(file, index, 0, file_size, stride)
+    with open(index_path(file_path), 'w') as index_file:
+        json.dump(index, index_file)
+    return index
+
+
+def load_index(file_path, stride=INDEX_STRIDE):
+    # Returns the index of file_path, building it the first time and
+    # extending it when the log has grown since it was written.
+    file_size = log_size(file_path)
+    try:
+        with open(index_path(file_path), 'r') as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return build_index(file_path, stride)
+
+    if index['size'] > file_size or index['stride'] != stride:
+        return build_index(file_path, stride)  # log truncated or rotated.
+
+    if index['size'] < file_size:
+        with open_log(file_path) as file:
+            _index_from(file, index, index['size'], file_size, stride)
+        with open(index_path(file_path), 'w') as index_file:
+            json.dump(index, index_file)
+    return index
+
+
+def find_offset(file_path, target_time, index=None):
+    # Byte offset of the first line whose timestamp is later than target_time,
+    # i.e. where a replay up to target_time has to stop.
+    if index is None:
+        index = load_index(file_path)
+    target_ns = to_ns(target_time)
+
+    i = bisect_right(index['times'], target_ns, key=log_time_ns) - 1
+    if i < 0:
+        return 0
+
+    offset = index['offsets'][i]
+    with open_log(file_path, offset) as file:
+        for raw_line in file:
+            if not raw_line.endswith(b'\n'):
+                break
+            if line_time_ns(raw_line) > target_ns:
+                break
+            offset += len(raw_line)
+    return offset
+
+
+def read_lines(file_path, end_offset=None, start_offset=0):
+    # Yields the decoded lines in [start_offset, end_offset), or up to the end of the file.
+    with open_log(file_path, start_offset) as file:
+        position = start_offset
+        for raw_line in file:
+            position += len(raw_line)
+            if end_offset is not None and position > end_offset:
+                break
+            yield raw_line.decode()
@@ -0,0 +1,120 @@
+import os
+import re
+import glob
+import heapq
+from operator import itemgetter
+
+from log_files import iter_chunks
+from log_index import find_offset
+from log_time import line_time_ns, to_ns
+
+
+"""
+
+Time-ordered stream of the lines of several quote logs.
+
+The logs are written per hour (20230425-0800_quote.log, 20230425-0900_quote.log, ...)
+and per liquidity provider. Instead of concatenating them, the lines of every log are
+merged by timestamp with a heap (k-way merge), one pass over each log:
+
+    merge_lines('20230425-*_quote.log')                       lines of the whole day
+    merge_lines([...], start_time, end_time)                  only the lines in the range
+    merge_feeds({'LP1': 'lp1/*_quote.log', 'LP2': [...]})     (feed label, line)
+
+Only one block of read_ahead bytes per log is held at a time, whatever the number of
+logs. The range is cut with the sidecar time index of every log (log_index), so logs
+outside it cost nothing. Lines with the same timestamp keep the order of the logs.
+
+The stream is a plain iterable of lines, so it goes wherever one log does: the
+log_pipeline stages, analyze_fix_log of plot_spread_from_logs_v02, and
+multi_symbol_replay.replay_symbols / replay_feeds, which take a glob or a list of logs.
+
+"""
+
+READ_AHEAD = 256 * 1024
+LOG_DAY = re.compile(r'^(\d{8})-\d{4}_quote\.log')  # day of an hourly log name.
+
+
+def is_log_set(files):
+    # True for a list of logs or a glob pattern, False for the path of one log.
+    if isinstance(files, str):
+        return glob.has_magic(files)
+    return True
+
+
+def log_paths(files):
+    # Paths of a glob pattern or of a list of paths and patterns, in name order for a
+    # pattern (the hourly logs sort by time).
+    if isinstance(files, str):
+        files = [files]
+    paths = []
+    for pattern in files:
+        if glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern)))
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def log_days(files):
+    # The logs (list, glob pattern) grouped by the day of their hourly log name, in the
+    # order of their first log. Logs with other names are a group of their own.
+    days = {}
+    for path in log_paths(files):
+        match = LOG_DAY.match(os.path.basename(path))
+        days.setdefault(match.group(1) if match else path, []).append(path)
+    return list(days.values())
+
+
+def _timed_lines(file_path, start_ns, end_time, read_ahead):
+    # (time ns, line) of the lines of file_path in the range.
+    start_offset = 0 if start_ns is None else find_offset(file_path, start_ns - 1)
+    end_offset = None if end_time is None else find_offset(file_path, end_time)
+    if end_offset is not None and end_offset <= start_offset:
+        return
+    for offset, block in iter_chunks(file_path, start_offset, end_offset, read_ahead):
+        for line in block.decode().splitlines(keepends=True):
+            yield line_time_ns(line), line
+
+
+def _merge(streams):
+    # heapq.merge keeps one line per stream in its heap and breaks ties by stream order.
+    return heapq.merge(*streams, key=itemgetter(0))
+
+
+def _labelled(label, lines):
+    for time_ns, line in lines:
+        yield time_ns, label, line
+
+
+def merge_lines(files, start_time=None, end_time=None, read_ahead=READ_AHEAD):
+    # Yields the lines of files (glob pattern or list) in time order, from start_time
+    # (included) to end_time (included) if given.
+    start_ns = None if start_time is None else to_ns(start_time)
+    streams = [_timed_lines(file_path, start_ns, end_time, read_ahead) for file_path in log_paths(files)]
+    for time_ns, line in _merge(streams):
+        yield line
+
+
+def merge_feeds(feeds, start_time=None, end_time=None, read_ahead=READ_AHEAD):
+    # Yields (label, line) in time order for feeds {label: glob pattern or list of logs}.
+    start_ns = None if start_time is None else to_ns(start_time)
+    streams = []
+    for label, files in feeds.items():
+        for file_path in log_paths(files):
+            streams.append(_labelled(label, _timed_lines(file_path, start_ns, end_time, read_ahead)))
+    for time_ns, label, line in _merge(streams):
+        yield label, line
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    files = '20230425-*_quote.log'
+
+    for i, line in enumerate(merge_lines(files, '2023-04-25 07:59:59.000')):
+        print(line.replace('\x01', '|'), end='')
+        if i == 10:
+            break
@@ -0,0 +1,83 @@
+from log_index import read_lines
+from log_time import log_time_ns, line_time_ns, to_ns
+from liquidity_book import apply_line_all, pip_size, top_of_book
+
+
+"""
+
+Lazy stages to replay a quote log: read -> filter -> extract FIX -> parse -> book update.
+
+Every stage takes an iterable and returns a generator, so the stages can be chained
+freely and nothing is materialised: memory stays flat whatever the size of the log
+and the first results come out as soon as the first lines are read.
+
+    lines = read_log(file_path)
+    lines = filter_symbol(lines, 'EURUSD_0')
+    messages = parse_messages(extract_fix(until_time(lines, target_time)))
+    for msg_time, symbol, bid, ask, spread in spread_points(update_books(messages)):
+        ...
+
+"""
+
+def read_log(file_path, end_offset=None, start_offset=0):
+    return read_lines(file_path, end_offset, start_offset)
+
+
+def filter_symbol(lines, target_symbol):
+    target_symbol_str = "=" + target_symbol + '\x01'
+    for line in lines:
+        if target_symbol_str in line:
+            yield line
+
+
+def until_time(lines, target_time):
+    # Stops at the first line later than target_time.
+    target_ns = to_ns(target_time)
+    for line in lines:
+        if line_time_ns(line) > target_ns:
+            return
+        yield line
+
+
+def extract_fix(lines):
+    # (log time, FIX message) of every line with a FIX message.
+    for line in lines:
+        start = line.find('8=FIX')
+        if start < 0:
+            continue
+        yield line.split('|', 1)[0], line[start:].rstrip('\n')
+
+
+def parse_messages(messages):
+    # (log time, MsgType (35), FIX message).
+    for time_str, fix_message in messages:
+        start = fix_message.find('\x0135=')
+        if start < 0:
+            continue
+        start += 4
+        end = fix_message.find('\x01', start)
+        yield time_str, fix_message[start:end], fix_message
+
+
+def update_books(messages, books=None, n_depths=5, symbols=None):
+    # Applies the 35=W / 35=i messages to the books (one per symbol) and yields
+    # (log time, symbol, liquidity_book) after every update. The yielded book is
+    # the live one, copy it to keep it.
+    if books is None:
+        books = {}
+    for time_str, msg_type, fix_message in messages:
+        if msg_type != 'W' and msg_type != 'i':
+            continue
+        for symbol in apply_line_all(books, fix_message, n_depths, symbols):
+            yield time_str, symbol, books[symbol]
+
+
+def spread_points(updates):
+    # (time ns, symbol, best bid, best ask, spread in pips) after every book update
+    # with both sides quoted.
+    for time_str, symbol, liquidity_book in updates:
+        top = top_of_book(liquidity_book)
+        if top is None:
+            continue
+        bid, ask = top
+        yield log_time_ns(time_str), symbol, bid, ask, (ask - bid) / pip_size(symbol)
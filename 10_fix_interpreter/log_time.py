@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+"""
+
+Fixed-format timestamp decoding to int epoch nanoseconds.
+
+The replay compares and records times as int ns since the epoch (the unit of the
+spread arrays and of the tick store) instead of datetime objects. The two formats
+of the logs have fixed positions, so they are sliced rather than parsed:
+
+    log line prefix   2023-04-25 07:00:00.123       log_time_ns
+    FIX tag 52        20230425-07:00:00.123         fix_time_ns
+
+The epoch of the date + hour + minute prefix is cached, so a line costs one dict
+lookup and two int conversions. Up to 9 fractional digits are accepted; str and
+bytes both work.
+
+"""
+
+EPOCH = datetime(1970, 1, 1)
+NS_PER_US = 1000
+NS_PER_MS = 1000000
+NS_PER_SECOND = 1000000000
+MAX_CACHED_MINUTES = 100000
+
+_minute_ns = {}
+
+
+def datetime_to_ns(msg_time):
+    return (msg_time - EPOCH) // timedelta(microseconds=1) * NS_PER_US
+
+
+def ns_to_datetime(time_ns):
+    return EPOCH + timedelta(microseconds=time_ns // NS_PER_US)
+
+
+def _fraction_ns(fraction):
+    if len(fraction) == 3:
+        return int(fraction) * NS_PER_MS
+    if not fraction:
+        return 0
+    return int(fraction) * 10 ** (9 - len(fraction))
+
+
+def _new_minute(prefix, year, month, day, hour, minute):
+    if len(_minute_ns) >= MAX_CACHED_MINUTES:
+        _minute_ns.clear()
+    minute_ns = datetime_to_ns(datetime(int(year), int(month), int(day), int(hour), int(minute)))
+    _minute_ns[prefix] = minute_ns
+    return minute_ns
+
+
+def log_time_ns(time_str):
+    # 'YYYY-MM-DD HH:MM:SS[.f...]' -> int ns since the epoch.
+    prefix = time_str[:16]
+    minute_ns = _minute_ns.get(prefix)
+    if minute_ns is None:
+        minute_ns = _new_minute(prefix, time_str[:4], time_str[5:7], time_str[8:10], time_str[11:13], time_str[14:16])
+    return minute_ns + int(time_str[17:19]) * NS_PER_SECOND + _fraction_ns(time_str[20:])
+
+
+def fix_time_ns(time_str):
+    # 'YYYYMMDD-HH:MM:SS[.f...]' (FIX UTCTimestamp, tag 52) -> int ns since the epoch.
+    prefix = time_str[:14]
+    minute_ns = _minute_ns.get(prefix)
+    if minute_ns is None:
+        minute_ns = _new_minute(prefix, time_str[:4], time_str[4:6], time_str[6:8], time_str[9:11], time_str[12:14])
+    return minute_ns + int(time_str[15:17]) * NS_PER_SECOND + _fraction_ns(time_str[18:])
+
+
+def line_time_ns(line):
+    # Time of a log line 'YYYY-MM-DD HH:MM:SS.fff|8=FIX...'.
+    return log_time_ns(line[:line.index('|' if isinstance(line, str) else b'|')])
+
+
+def to_ns(time):
+    # Query times as int ns: log time strings, datetimes (pandas Timestamps too),
+    # numpy datetime64 of any unit or ns.
+    if isinstance(time, (str, bytes)):
+        return log_time_ns(time)
+    if isinstance(time, datetime):
+        return datetime_to_ns(time)
+    if isinstance(time, np.datetime64):
+        return int(np.datetime64(time, 'ns').astype(np.int64))
+    return int(time)
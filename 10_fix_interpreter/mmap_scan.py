@@ -0,0 +1,74 @@
+import mmap
+
+from log_files import is_compressed, iter_chunks
+
+
+"""
+
+Memory-mapped symbol scan of quote logs.
+
+The log is mmapped and searched for b'=SYMBOL\x01' with find, so the lines of the
+other symbols are never split, decoded or copied: only the matching lines are
+sliced out, as memoryviews over the map. Compressed logs cannot be mapped: the same
+find runs over the blocks of complete lines coming from the decompression thread.
+
+"""
+
+def scan_symbol(file_path, target_symbol, start_offset=0, end_offset=None):
+    # Yields a memoryview of every line in [start_offset, end_offset) that contains
+    # =target_symbol\x01. The views point into the map: copy or decode them before
+    # keeping them.
+    needle = ("=" + target_symbol + '\x01').encode()
+    if is_compressed(file_path):
+        yield from _scan_blocks(file_path, needle, start_offset, end_offset)
+        return
+
+    with open(file_path, 'rb') as file:
+        try:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # empty file.
+
+    if end_offset is None:
+        end_offset = len(mm)
+    view = memoryview(mm)
+    try:
+        position = start_offset
+        while True:
+            position = mm.find(needle, position, end_offset)
+            if position < 0:
+                break
+            line_start = mm.rfind(b'\n', start_offset, position) + 1
+            if line_start == 0:
+                line_start = start_offset
+            line_end = mm.find(b'\n', position, end_offset)
+            line_end = end_offset if line_end < 0 else line_end + 1
+            yield view[line_start:line_end]
+            position = line_end
+    finally:
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            pass  # views still held by the consumer, the map is closed when they are released.
+
+
+def _scan_blocks(file_path, needle, start_offset, end_offset):
+    for offset, block in iter_chunks(file_path, start_offset, end_offset):
+        view = memoryview(block)
+        position = 0
+        while True:
+            position = block.find(needle, position)
+            if position < 0:
+                break
+            line_start = block.rfind(b'\n', 0, position) + 1
+            line_end = block.find(b'\n', position)
+            line_end = len(block) if line_end < 0 else line_end + 1
+            yield view[line_start:line_end]
+            position = line_end
+
+
+def decode_lines(views):
+    # Decodes the matching lines for the str based parsers.
+    for line in views:
+        yield str(line, 'latin-1')
@@ -0,0 +1,120 @@
+import os
+import pandas as pd
+
+from log_index import find_offset, read_lines
+from log_time import line_time_ns
+from liquidity_book import apply_line_all, sort_liquidity_book
+from spread_recorder import SpreadRecorder
+from pipeline_profiler import NO_PROFILER
+from log_merge import is_log_set, merge_lines, merge_feeds
+
+
+"""
+
+Single pass replay of a quote log for every symbol in it.
+
+The log is read once, keeping a liquidity book per symbol (302 QuoteSetID for mass
+quotes, 55/262 for full refreshes) and, if spreads=True, the Bid/Ask/Spread series
+of every symbol as analyze_fix_log builds it for a single one.
+
+replay_symbols also takes a glob pattern or a list of hourly logs (one pass over
+their time-ordered merge), and replay_feeds the logs of several liquidity providers.
+
+"""
+
+def replay_lines(lines, books, recorders=None, symbols=None, n_depths=5, spreads=True, profiler=NO_PROFILER):
+    # Replays lines on top of books (updated in place). Returns the books and
+    # recorders ({symbol: SpreadRecorder}, extended in place) of the updates.
+    if recorders is None:
+        recorders = {}
+    needles = None
+    if symbols is not None:
+        needles = ["=" + symbol + '\x01' for symbol in symbols]
+    apply = profiler.timed('parse', apply_line_all)
+    record = profiler.timed('record', SpreadRecorder.record)
+
+    for line in profiler.timed_iter('read', lines):
+        if profiler.enabled:
+            profiler.bytes_read += len(line)
+        if needles is not None and not any(needle in line for needle in needles):
+            continue  # cheaper than tokenizing lines of other symbols.
+        updated = apply(books, line, n_depths, symbols)
+        if profiler.enabled:
+            profiler.count_line(line, updated)
+        if not updated or not spreads:
+            continue
+
+        time_ns = line_time_ns(line)
+        for symbol in updated:
+            if symbol not in recorders:
+                recorders[symbol] = SpreadRecorder(symbol)
+            record(recorders[symbol], books[symbol], time_ns)
+    return books, recorders
+
+
+def replay_range(file_path, books, start_offset=0, end_offset=None, symbols=None, n_depths=5, spreads=True,
+                 profiler=NO_PROFILER):
+    # Replays the lines in [start_offset, end_offset) on top of books (updated in place).
+    # Returns the books and {symbol: SpreadRecorder} of the updates in the range.
+    lines = read_lines(file_path, end_offset, start_offset)
+    return replay_lines(lines, books, {}, symbols, n_depths, spreads, profiler)
+
+
+def replay_symbols(file_path, target_time=None, symbols=None, n_depths=5, spreads=True, profiler=NO_PROFILER):
+    # Returns ({symbol: liquidity_book}, {symbol: spread DataFrame}) at target_time
+    # (or the end of the log). symbols restricts the replay to a subset.
+    # file_path can also be a glob pattern or a list of logs, replayed as one
+    # time-ordered stream (log_merge).
+    if symbols is not None:
+        symbols = set(symbols)
+
+    if is_log_set(file_path):
+        books, recorders = replay_lines(merge_lines(file_path, end_time=target_time), {}, {}, symbols, n_depths, spreads, profiler)
+    else:
+        end_offset = None
+        if target_time is not None:
+            end_offset = profiler.timed('index', find_offset)(file_path, target_time)
+        books, recorders = replay_range(file_path, {}, 0, end_offset, symbols, n_depths, spreads, profiler)
+    spread_frames = {symbol: profiler.timed('record', recorder.to_frame)() for symbol, recorder in recorders.items() if len(recorder)}
+
+    return books, spread_frames
+
+
+def replay_feeds(feeds, target_time=None, symbols=None, n_depths=5, spreads=True):
+    # replay_symbols of several feeds {label: glob pattern or list of logs} in one
+    # time-ordered pass. Returns ({label: books}, {label: spread_frames}).
+    if symbols is not None:
+        symbols = set(symbols)
+    books = {label: {} for label in feeds}
+    recorders = {label: {} for label in feeds}
+
+    for label, line in merge_feeds(feeds, end_time=target_time):
+        replay_lines((line,), books[label], recorders[label], symbols, n_depths, spreads)
+
+    spread_frames = {label: {symbol: recorder.to_frame() for symbol, recorder in feed_recorders.items() if len(recorder)}
+                     for label, feed_recorders in recorders.items()}
+    return books, spread_frames
+
+
+def spread_summary(spread_frames):
+    # One row per symbol with the usual spread statistics.
+    summary = {symbol: df['Spread'].describe() for symbol, df in spread_frames.items()}
+    return pd.DataFrame(summary).T
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    target_time = '2023-04-25 07:59:59.996'
+
+    file_path = '20230425-0800_quote.log'
+
+    books, spread_frames = replay_symbols(file_path, target_time)
+
+    for symbol, liquidity_book in sorted(books.items()):
+        print(symbol)
+        print(pd.DataFrame.from_records(sort_liquidity_book(liquidity_book)))
+
+    print(spread_summary(spread_frames))
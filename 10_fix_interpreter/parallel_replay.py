@@ -0,0 +1,175 @@
+import os
+import re
+import glob
+import mmap
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from log_index import find_offset, load_index
+from log_files import is_compressed, iter_chunks, log_size
+from log_merge import log_days
+from book_checkpoints import load_checkpoints, checkpoint_books, checkpoint_path
+from multi_symbol_replay import replay_symbols, replay_range
+
+
+"""
+
+Multi-core replay of quote logs with a ProcessPoolExecutor.
+
+Three ways of splitting the work, all giving the same books and spread series as
+multi_symbol_replay.replay_symbols:
+
+    by='symbol'  every worker replays the whole log for a subset of the symbols.
+    by='range'   the log is cut into byte ranges at checkpoint offsets (line boundaries),
+                 every worker starts from the books of its checkpoint and the spread
+                 series of the ranges are concatenated in order. The checkpoints are a
+                 serial pass over the log the first time (book_checkpoints), so a log
+                 without a .ckpt file is split by symbol instead.
+    replay_files_parallel  one job per day of hourly logs (e.g. a month), the books
+                 carried through the hours of the day and the days merged in order.
+
+The merged dicts are ordered by symbol so the output does not depend on which
+worker finishes first.
+
+"""
+
+def log_symbols(file_path):
+    # Symbols quoted in a log (302 QuoteSetID, 55/262), found with one regex pass over the map.
+    # The closing SOH is a lookahead: it starts the next field (262=...\x0155=...).
+    pattern = re.compile(rb'\x01(?:302|55|262)=([^\x01]+)(?=\x01)')
+    if is_compressed(file_path):
+        symbols = set()
+        for offset, block in iter_chunks(file_path):
+            symbols.update(match.group(1).decode() for match in pattern.finditer(block))
+        return sorted(symbols)
+
+    with open(file_path, 'rb') as file:
+        try:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return []  # empty file.
+        with mm:
+            symbols = {match.group(1).decode() for match in pattern.finditer(mm)}
+    return sorted(symbols)
+
+
+def _replay_shard(file_path, checkpoint, start_offset, end_offset, n_depths, spreads):
+    books = checkpoint_books(file_path, checkpoint) if checkpoint is not None else {}
+    books, recorders = replay_range(file_path, books, start_offset, end_offset, None, n_depths, spreads)
+    return books, {symbol: recorder.to_frame() for symbol, recorder in recorders.items() if len(recorder)}
+
+
+def _shards(checkpoints, end_offset, n_shards):
+    # Splits [0, end_offset) at the checkpoints closest to n_shards equal byte ranges.
+    offsets = [c[1] for c in checkpoints]
+    cuts = [(0, None)]
+    for k in range(1, n_shards):
+        i = bisect_right(offsets, end_offset * k // n_shards) - 1
+        if i >= 0 and offsets[i] > cuts[-1][0] and offsets[i] < end_offset:
+            cuts.append((offsets[i], checkpoints[i]))
+    return [(start, checkpoint, end) for (start, checkpoint), (end, _) in zip(cuts, cuts[1:] + [(end_offset, None)])]
+
+
+def _sorted_dict(d):
+    return {key: d[key] for key in sorted(d)}
+
+
+def replay_symbols_parallel(file_path, target_time=None, symbols=None, n_depths=5, spreads=True, workers=None, by='symbol'):
+    # Same result as replay_symbols(file_path, target_time, symbols, n_depths, spreads).
+    # by='range' needs the checkpoints of the log: building them is a full serial replay,
+    # slower than the serial replay_symbols itself, so without a checkpoint file the log
+    # is split by symbol. A log grown since its checkpoints is only replayed from the
+    # last one to extend them.
+    workers = workers or os.cpu_count()
+    if by == 'range' and not os.path.exists(checkpoint_path(file_path)):
+        by = 'symbol'
+    if target_time is not None:
+        load_index(file_path)  # built once here rather than by every worker.
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if by == 'symbol':
+            symbols = sorted(symbols) if symbols is not None else log_symbols(file_path)
+            subsets = [symbols[k::workers] for k in range(workers) if symbols[k::workers]]
+            results = executor.map(replay_symbols, [file_path] * len(subsets), [target_time] * len(subsets),
+                                   subsets, [n_depths] * len(subsets), [spreads] * len(subsets))
+            books, spread_frames = {}, {}
+            for shard_books, shard_frames in results:
+                books.update(shard_books)
+                spread_frames.update(shard_frames)
+
+        elif by == 'range':
+            end_offset = log_size(file_path) if target_time is None else find_offset(file_path, target_time)
+            shards = _shards(load_checkpoints(file_path, n_depths=n_depths), end_offset, workers)
+            futures = [executor.submit(_replay_shard, file_path, checkpoint, start, end, n_depths, spreads)
+                       for start, checkpoint, end in shards]
+
+            books, pieces = {}, {}
+            for future in futures:  # in shard order.
+                books, shard_frames = future.result()
+                for symbol, df in shard_frames.items():
+                    pieces.setdefault(symbol, []).append(df)
+            spread_frames = {symbol: pd.concat(dfs) if len(dfs) > 1 else dfs[0] for symbol, dfs in pieces.items()}
+            if symbols is not None:
+                books = {symbol: book for symbol, book in books.items() if symbol in symbols}
+                spread_frames = {symbol: df for symbol, df in spread_frames.items() if symbol in symbols}
+
+        else:
+            raise ValueError(f"by must be 'symbol' or 'range', not {by!r}")
+
+    return _sorted_dict(books), _sorted_dict(spread_frames)
+
+
+def replay_files_parallel(files, target_time=None, symbols=None, n_depths=5, spreads=True, workers=None):
+    # One replay_symbols job per day of hourly logs (list, glob pattern). The books are
+    # carried through the hours of a day and start empty every day, as the session does
+    # (logon with 141=Y): the result is that of replay_symbols day by day, the books at
+    # the end of the last day quoting each symbol and the spread series of the days
+    # concatenated. For the logs of one day it is replay_symbols(files).
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(replay_symbols, day, target_time, symbols, n_depths, spreads)
+                   for day in log_days(files)]
+
+        books, pieces = {}, {}
+        for future in futures:  # in day order.
+            day_books, day_frames = future.result()
+            books.update(day_books)
+            for symbol, df in day_frames.items():
+                pieces.setdefault(symbol, []).append(df)
+    spread_frames = {symbol: pd.concat(dfs) if len(dfs) > 1 else dfs[0] for symbol, dfs in pieces.items()}
+    return _sorted_dict(books), _sorted_dict(spread_frames)
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+
+    load_checkpoints(file_path)  # by='range' cuts the log at its checkpoints.
+    books, spread_frames = replay_symbols_parallel(file_path, by='range')
+
+    for symbol, df in spread_frames.items():
+        print(symbol, len(df), df['Spread'].mean())
+
+    # Both splits give the books and spread series of the serial replay.
+    serial_books, serial_frames = replay_symbols(file_path)
+    for by in ('symbol', 'range'):
+        books, spread_frames = replay_symbols_parallel(file_path, by=by)
+        assert books == _sorted_dict(serial_books), by
+        assert spread_frames.keys() == serial_frames.keys(), by
+        for symbol, df in spread_frames.items():
+            pd.testing.assert_frame_equal(df, serial_frames[symbol])
+    print('parallel replays match the serial replay')
+
+    # The hourly logs of a day, replayed one day per job, give the serial replay of the day.
+    day_logs = sorted(glob.glob(file_path[:9] + '*_quote.log'))
+    serial_books, serial_frames = replay_symbols(day_logs)
+    books, spread_frames = replay_files_parallel(day_logs)
+    assert books == _sorted_dict(serial_books)
+    assert spread_frames.keys() == serial_frames.keys()
+    for symbol, df in spread_frames.items():
+        pd.testing.assert_frame_equal(df, serial_frames[symbol])
+    print(f'replay_files_parallel of {len(day_logs)} logs matches the serial replay')
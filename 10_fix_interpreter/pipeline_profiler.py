@@ -0,0 +1,179 @@
+import json
+import time
+import tracemalloc
+from collections import Counter
+
+import pandas as pd
+
+
+"""
+
+Optional instrumentation of the log analysis runs.
+
+    profiler = Profiler(memory=True)
+    analyze_fix_log(target_symbol, target_time, file_path, profiler=profiler)
+    profiler.report()                  # summary table
+    profiler.to_json('profile.json')
+
+Per stage: calls, wall and CPU seconds (CPU is process time, so it includes the
+decompression thread of a compressed log). Per run: messages per MsgType (35) and per
+symbol, bytes read and, with memory=True, the tracemalloc peak.
+
+The instrumented code wraps its steps with profiler.timed(name, function) and
+profiler.timed_iter(name, iterable). The times are exclusive: while a stage pulls
+items from another timed stage (chained generators of log_pipeline) the time goes to
+the inner one, and time outside every stage goes to 'other'. So the stages add up
+to the total.
+
+A disabled profiler (NO_PROFILER, the default) returns the function or iterable
+itself, so the loops run exactly as without it.
+
+"""
+
+class Profiler:
+    def __init__(self, enabled=True, memory=False):
+        self.enabled = enabled
+        self.memory = memory and enabled
+        self.stages = {}  # name: [calls, wall seconds, cpu seconds]
+        self.msg_types = Counter()
+        self.symbols = Counter()
+        self.bytes_read = 0
+        self.peak_memory = None
+        self._stopped = not enabled
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._current = self._stage('other')
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+
+    def _stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = [0, 0.0, 0.0]
+        return self.stages[name]
+
+    def _switch(self, stage):
+        # Charges the time since the last switch to the running stage and runs stage.
+        wall, cpu = time.perf_counter(), time.process_time()
+        previous = self._current
+        previous[1] += wall - self._wall
+        previous[2] += cpu - self._cpu
+        self._current = stage
+        self._wall, self._cpu = wall, cpu
+        return previous
+
+    def timed(self, name, function):
+        if not self.enabled:
+            return function
+        stage = self._stage(name)
+
+        def timed_function(*args, **kwargs):
+            stage[0] += 1
+            previous = self._switch(stage)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._switch(previous)
+        return timed_function
+
+    def timed_iter(self, name, iterable):
+        # Times the production of every item (the work of the stage for that item).
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(self._stage(name), iter(iterable))
+
+    def _timed_iter(self, stage, iterator):
+        while True:
+            stage[0] += 1
+            previous = self._switch(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._switch(previous)
+            yield item
+
+    def count_line(self, line, symbols=()):
+        # Counts a log line: its MsgType and the symbols it updated.
+        start = line.find('\x0135=')
+        if start >= 0:
+            self.msg_types[line[start + 4:line.find('\x01', start + 4)]] += 1
+        self.symbols.update(symbols)
+
+    def count_messages(self, messages):
+        # Counts the MsgTypes of (log time, MsgType, FIX message) items as they pass.
+        if not self.enabled:
+            return messages
+        return self._count_messages(messages)
+
+    def _count_messages(self, messages):
+        msg_types = self.msg_types
+        for message in messages:
+            msg_types[message[1]] += 1
+            yield message
+
+    def stop(self):
+        # Ends the run: charges the running stage, the total and the memory peak.
+        # Called by summary and to_dict.
+        if self._stopped:
+            return
+        self._stopped = True
+        self._switch(self._current)
+        self.stages['total'] = [1, sum(stage[1] for stage in self.stages.values()), sum(stage[2] for stage in self.stages.values())]
+        if self.memory and tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def summary(self):
+        # DataFrame with one row per stage.
+        self.stop()
+        df = pd.DataFrame.from_dict(self.stages, orient='index', columns=['calls', 'wall s', 'cpu s'])
+        if 'total' in self.stages and self.stages['total'][1] > 0:
+            df['wall %'] = 100 * df['wall s'] / self.stages['total'][1]
+        return df
+
+    def to_dict(self):
+        self.stop()
+        return {
+            'stages': {name: dict(zip(('calls', 'wall', 'cpu'), values)) for name, values in self.stages.items()},
+            'msg_types': dict(self.msg_types),
+            'symbols': dict(self.symbols),
+            'bytes_read': self.bytes_read,
+            'peak_memory': self.peak_memory,
+        }
+
+    def to_json(self, path=None):
+        # JSON string of the run, also written to path if given.
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as json_file:
+                json_file.write(text)
+        return text
+
+    def report(self):
+        print(self.summary().round(4).to_string())
+        print(f"\nbytes read: {self.bytes_read}")
+        if self.peak_memory is not None:
+            print(f"peak memory (tracemalloc): {self.peak_memory / 1e6:.1f} MB")
+        if self.msg_types:
+            print("messages per 35:", dict(self.msg_types.most_common()))
+        if self.symbols:
+            print("updates per symbol:", dict(self.symbols.most_common()))
+
+
+NO_PROFILER = Profiler(enabled=False)
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    import os
+    from plot_spread_from_logs import analyze_fix_log
+
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+
+    profiler = Profiler(memory=True)
+    analyze_fix_log('AUDNZD_0', '2023-04-25 07:59:59.996', file_path, profiler=profiler)
+    profiler.report()
+    profiler.to_json('profile.json')
@@ -1,9 +1,14 @@
-import re
-import copy
 import pandas as pd
-import plotly.express as px
 from datetime import datetime
 import os
+from log_index import find_offset
+from mmap_scan import scan_symbol, decode_lines
+from liquidity_book import new_liquidity_book, apply_line, sort_liquidity_book
+from book_checkpoints import book_at
+from spread_recorder import SpreadRecorder
+from log_time import line_time_ns
+from spread_plot import spread_figure
+from pipeline_profiler import NO_PROFILER
 
 # Change to working path
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -20,175 +25,67 @@ def print_fix(s):
     print(s.replace('\x01', '|'))
 
 
-# Mass Quote
-def parse_mass_quote(liquidity_book, line, target_symbol_str):
-
-    symbol_chunks = re.split(r'(302=[^\x01]+\x01)', line)
-
-    for i in range(1, len(symbol_chunks), 2):
-        if target_symbol_str not in symbol_chunks[i]:
-            continue
-        
-        level_content_all = symbol_chunks[i] + symbol_chunks[i+1]
-        level_chunks = re.split(r'(299=\d\x01)', level_content_all)
-        
-        for i in range(1, len(level_chunks), 2):
-            level_content = level_chunks[i] + level_chunks[i+1]
-
-            level_match = re.search(r'299=([\d.]+)\x01', level_content)
-            level = int(level_match.group(1))
-            
-            bid_match = re.search(r'188=([-?\d.]+)\x01', level_content)
-            ask_match = re.search(r'190=([-?\d.]+)\x01', level_content)
-            bid_size_match = re.search(r'134=([-?\d.]+)\x01', level_content)
-            ask_size_match = re.search(r'135=([-?\d.]+)\x01', level_content)
-            
-            if bid_match:
-                liquidity_book[level]['Bid'] = float(bid_match.group(1))
-            if ask_match:
-                liquidity_book[level]['Ask'] = float(ask_match.group(1))
-            if bid_size_match:
-                size = float(bid_size_match.group(1))
-                if size < 0:  # quote cancelled.
-                    size = 0
-                    liquidity_book[level]['Bid'] = 0
-                liquidity_book[level]['Bid Size'] = size
-            if ask_size_match:
-                size = float(ask_size_match.group(1))
-                if size < 0:  # quote cancelled.
-                    size = 0
-                    liquidity_book[level]['Ask'] = 0
-                liquidity_book[level]['Ask Size'] = size
-    return liquidity_book
-
-
-# Market Data - Snapshot/Full Refresh
-def parse_full_refresh(liquidity_book, line, target_symbol_str):
-    # print_fix(line)
-    if f'55{target_symbol_str}' not in line and f'262{target_symbol_str}' not in line:
-        return liquidity_book
-
-    level_chunks = re.split(r'(269=\d\x01)', line)
-
-    for i in range(1, len(level_chunks), 2):
-        level_content = level_chunks[i] + level_chunks[i+1]
-        
-        entry_type = int(level_chunks[i][4])  # can only have one char.
-        
-        level_match = re.search(r'299=([\d.]+)\x01', level_content)
-        level = int(level_match.group(1))
-        
-        price_match = re.search(r'270=([-?\d.]+)\x01', level_content)
-        size_match = re.search(r'271=([-?\d.]+)\x01', level_content)
-        
-        if entry_type == 0:  # Bid
-            if price_match:
-                liquidity_book[level]['Bid'] = float(price_match.group(1))
-            if size_match:
-                size = float(size_match.group(1))
-                if size < 0:  # quote cancelled.
-                    size = 0
-                    liquidity_book[level]['Bid'] = 0
-                liquidity_book[level]['Bid Size'] = size
-        elif entry_type == 1:  # Ask
-            if price_match:
-                liquidity_book[level]['Ask'] = float(price_match.group(1))
-            if size_match:
-                size = float(size_match.group(1))
-                if size < 0:  # quote cancelled.
-                    size = 0
-                    liquidity_book[level]['Ask'] = 0
-                liquidity_book[level]['Ask Size'] = size
-    return liquidity_book
-
-
-def add_spread_data(df, liquidity_book, target_symbol, msg_time):
-    
-    if 'JPY' in target_symbol:
-        pip = 0.01
-    else:
-        pip = 0.0001
-        
-    highest_bid = max(liquidity_book, key=lambda d: d['Bid'] if(d['Bid'] > 0 and d['Bid Size'] > 0) else -float('inf'))
-    lowest_ask = min(liquidity_book, key=lambda d: d['Ask'] if (d['Ask'] > 0 and d['Ask Size'] > 0) else float('inf'))
-    
-    if highest_bid['Bid'] <= 0 or lowest_ask['Ask'] <= 0:
-        return df
-
-    new_row = pd.DataFrame({
-        'Bid': highest_bid['Bid'], 
-        'Ask': lowest_ask['Ask'],
-        'Spread': (lowest_ask['Ask'] - highest_bid['Bid']) / pip
-    }, index=[msg_time])
-
-    return pd.concat([df, new_row])
-
-
 def plot_data(df, target_symbol):
+    # One Quote/Spread chart with WebGL traces downsampled to spread_plot.PLOT_POINTS,
+    # so a full day of ticks still opens in the browser.
+    spread_figure(df, target_symbol).show()
 
-    fig1 = px.line(df, y=['Bid', 'Ask'])
-    fig1.update_layout(xaxis_title='', yaxis_title=f'{target_symbol} Quote')
-    fig1.show()
-
-    fig2 = px.line(df, y='Spread')
-    fig2.update_layout(xaxis_title='', yaxis_title=f'{target_symbol} Spread')
-    fig2.show()
 
-
-def analyze_fix_log(target_symbol, target_time, file_path, plot=True, n_depths=5):
-    
-    df = pd.DataFrame()
-    liquidity_book = [{'Bid': 0.0, 'Ask': 0.0, 'Bid Size': 0.0, 'Ask Size': 0.0} for level in range(n_depths)]
+def analyze_fix_log(target_symbol, target_time, file_path, plot=True, n_depths=5, store_path=None, profiler=NO_PROFILER):
+    # With store_path the book and the spread series are rebuilt from the tick store
+    # (tick_store.convert_log) instead of parsing file_path.
+    # profiler (pipeline_profiler.Profiler) times the stages and counts the messages.
     target_time_obj = datetime.strptime(target_time, '%Y-%m-%d %H:%M:%S.%f')
     target_symbol_str = "=" + target_symbol + '\x01'
+    plot_chart = profiler.timed('plot', plot_data)
+
+    if store_path is not None:
+        from tick_store import replay_store
+        liquidity_book, df = profiler.timed('replay_store', replay_store)(store_path, target_symbol, target_time_obj, n_depths, spreads=plot)
+        if plot:
+            plot_chart(df, target_symbol)
+    elif not plot:
+        # Without the spread series only the tail after the nearest checkpoint is replayed.
+        liquidity_book = profiler.timed('book_at', book_at)(file_path, target_symbol, target_time_obj, n_depths)
+    else:
+        liquidity_book = new_liquidity_book(n_depths)
+        recorder = SpreadRecorder(target_symbol)
+        apply = profiler.timed('parse', apply_line)
+        record = profiler.timed('record', recorder.record)
+
+        # The sidecar index gives the offset of the first line after target_time.
+        end_offset = profiler.timed('index', find_offset)(file_path, target_time_obj)
+        profiler.bytes_read += end_offset
+
+        # Only the lines of target_symbol are sliced out of the mmapped log and decoded.
+        lines = profiler.timed_iter('scan', decode_lines(scan_symbol(file_path, target_symbol, end_offset=end_offset)))
+        for line in lines:
+            updated = apply(liquidity_book, line, target_symbol_str)
+            if profiler.enabled:
+                profiler.count_line(line, (target_symbol,) if updated else ())
+            if not updated:
+                continue
 
+            record(liquidity_book, line_time_ns(line))
 
-    with open(file_path, 'r') as file:
-        for line in file:
-            if target_symbol_str not in line:
-                continue
-            
-            msg_time = datetime.strptime(line.split('|')[0], '%Y-%m-%d %H:%M:%S.%f')
-            if msg_time > target_time_obj:
-                break
-            
-            if '35=W' in line:
-                liquidity_book = parse_full_refresh(liquidity_book, line, target_symbol_str)
-            elif '35=i' in line:
-                liquidity_book = parse_mass_quote(liquidity_book, line, target_symbol_str)
-            else:
-                continue
-            
-            if plot:
-                df = add_spread_data(df, liquidity_book, target_symbol, msg_time)
-
-    if plot:
-        plot_data(df, target_symbol)
-
-    # New solution for ordering because I think the other one could only handle one shift at a time, not sure.
-    sorted_bid = sorted(copy.deepcopy(liquidity_book), key=lambda d: d['Bid'] if d['Ask'] > 0 else -float('inf'), reverse=True)
-    sorted_ask = sorted(copy.deepcopy(liquidity_book), key=lambda d: d['Ask'] if d['Ask'] > 0 else float('inf'))
-    for i in range(n_depths):
-        liquidity_book[i]['Bid'] = sorted_bid[i]['Bid']
-        liquidity_book[i]['Bid Size'] = sorted_bid[i]['Bid Size']
-        liquidity_book[i]['Ask'] = sorted_ask[i]['Ask']
-        liquidity_book[i]['Ask Size'] = sorted_ask[i]['Ask Size']
-
-    df_book = pd.DataFrame.from_records(liquidity_book, index=range(n_depths))
+        plot_chart(profiler.timed('record', recorder.to_frame)(), target_symbol)
+
+    df_book = pd.DataFrame.from_records(sort_liquidity_book(liquidity_book), index=range(n_depths))
     print(df_book)
     return df_book
 
 
 #------------------------------------------------------------------------------------------#
 
-plot = True
+if __name__ == '__main__':
+    plot = True
 
-target_symbol = "AUDNZD_0"
+    target_symbol = "AUDNZD_0"
 
-# target_time = '2023-04-25 07:00:30.000'
-target_time = '2023-04-25 07:05:00.039'  # the second 35=W message for AUDNZD_0.
-# target_time = '2023-04-25 07:59:59.996'  # latest time
+    # target_time = '2023-04-25 07:00:30.000'
+    target_time = '2023-04-25 07:05:00.039'  # the second 35=W message for AUDNZD_0.
+    # target_time = '2023-04-25 07:59:59.996'  # latest time
 
-file_path = '20230425-0800_quote.log'
+    file_path = '20230425-0800_quote.log'
 
-analyze_fix_log(target_symbol, target_time, file_path, plot)
+    analyze_fix_log(target_symbol, target_time, file_path, plot)
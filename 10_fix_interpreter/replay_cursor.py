@@ -0,0 +1,94 @@
+from bisect import bisect_right
+
+from log_time import log_time_ns, line_time_ns, to_ns
+from log_files import open_log
+from liquidity_book import apply_line_all
+from book_checkpoints import load_checkpoints, checkpoint_books
+
+
+"""
+
+Incremental replay cursor over a quote log.
+
+The cursor keeps the file position and the books of every symbol, so moving forward
+in time only applies the messages between the previous time and the new one:
+
+    cursor = BookReplayCursor.at(file_path, '2023-04-25 07:00:00.000')
+    while ...:
+        cursor.advance_to(cursor.time + 100 * NS_PER_MS)
+        book = cursor.snapshot('EURUSD_0')
+
+"""
+
+class BookReplayCursor:
+    def __init__(self, file_path, symbols=None, n_depths=5, books=None, offset=0):
+        self.file_path = file_path
+        self.symbols = set(symbols) if symbols is not None else None
+        self.n_depths = n_depths
+        self.books = books if books is not None else {}
+        self.offset = offset
+        self.time = None
+        self._file = open_log(file_path)
+
+    @classmethod
+    def at(cls, file_path, start_time, symbols=None, n_depths=5):
+        # Cursor at start_time, starting from the nearest checkpoint instead of the file head.
+        start_time = to_ns(start_time)
+        checkpoints = load_checkpoints(file_path, n_depths=n_depths)
+        i = bisect_right(checkpoints, start_time, key=lambda c: log_time_ns(c[0])) - 1
+
+        books, offset = {}, 0
+        if i >= 0:
+            books = checkpoint_books(file_path, checkpoints[i])
+            offset = checkpoints[i][1]
+            if symbols is not None:
+                books = {symbol: book for symbol, book in books.items() if symbol in symbols}
+
+        cursor = cls(file_path, symbols, n_depths, books, offset)
+        cursor.advance_to(start_time)
+        return cursor
+
+    def advance_to(self, target_time):
+        # Applies the messages up to target_time. Returns the updated symbols.
+        # cursor.time is the int ns time of the last advance_to.
+        target_time = to_ns(target_time)
+        if self.time is not None and target_time < self.time:
+            raise ValueError(f"the cursor is at {self.time}, it cannot go back to {target_time}")
+
+        updated = set()
+        self._file.seek(self.offset)
+        while True:
+            raw_line = self._file.readline()
+            if not raw_line.endswith(b'\n'):
+                break  # end of the log or partial line still being written.
+            if line_time_ns(raw_line) > target_time:
+                break
+            line = raw_line.decode()
+            updated.update(apply_line_all(self.books, line, self.n_depths, self.symbols))
+            self.offset += len(raw_line)
+
+        self.time = target_time
+        return updated
+
+    def snapshot(self, symbol=None):
+        # Sorted copy of the book of symbol, or of all the books.
+        if symbol is not None:
+            if symbol not in self.books:
+                return None
+            return self.books[symbol].levels()
+        return {symbol: book.levels() for symbol, book in self.books.items()}
+
+    def clone(self):
+        # Independent cursor at the same position, to branch the replay.
+        cursor = BookReplayCursor(self.file_path, self.symbols, self.n_depths, {symbol: book.copy() for symbol, book in self.books.items()}, self.offset)
+        cursor.time = self.time
+        return cursor
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,163 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from liquidity_book import pip_size
+from multi_symbol_replay import replay_symbols
+
+
+"""
+
+Vectorized spread analytics over whole top of book series.
+
+The input is a DataFrame indexed by time with Bid, Ask, Spread and the Bid Size /
+Ask Size of the top, as SpreadRecorder.to_frame and replay_symbols return it
+(or top_frame builds it from book_snapshots). Nothing loops over ticks in Python:
+
+    spread_pips, mid_price, microprice   element wise on arrays
+    time_weighted_spread                 every value weighted by how long it was in the book
+    spread_bars                          OHLC, count, percentiles and time-weighted spread
+                                         per bucket of any fixed frequency ('1s', '5min', '1D')
+    spread_statistics                    one row per symbol for a dict of spread frames
+
+"""
+
+def spread_pips(bid, ask, symbol):
+    return (np.asarray(ask) - np.asarray(bid)) / pip_size(symbol)
+
+
+def mid_price(bid, ask):
+    return (np.asarray(bid) + np.asarray(ask)) / 2
+
+
+def microprice(bid, ask, bid_size, ask_size):
+    # Mid weighted by the size on the other side: closer to the ask when the bid is heavier.
+    bid, ask = np.asarray(bid), np.asarray(ask)
+    bid_size, ask_size = np.asarray(bid_size), np.asarray(ask_size)
+    return (bid * ask_size + ask * bid_size) / (bid_size + ask_size)
+
+
+def add_prices(df):
+    # Copy of df with the Mid and Microprice columns.
+    df = df.copy()
+    df['Mid'] = mid_price(df['Bid'], df['Ask'])
+    df['Microprice'] = microprice(df['Bid'], df['Ask'], df['Bid Size'], df['Ask Size'])
+    return df
+
+
+def top_frame(query_times, snapshot, symbol):
+    # Top of book frame of one symbol from a book_snapshots array, without the
+    # queries where one of the sides is empty.
+    bid, ask, bid_size, ask_size = (snapshot[:, 0, field] for field in range(4))
+    quoted = (bid > 0) & (ask > 0) & (bid_size > 0) & (ask_size > 0)
+    df = pd.DataFrame({
+        'Bid': bid,
+        'Ask': ask,
+        'Spread': spread_pips(bid, ask, symbol),
+        'Bid Size': bid_size,
+        'Ask Size': ask_size,
+    }, index=pd.DatetimeIndex(pd.to_datetime(query_times)))
+    return df[quoted]
+
+
+def _time_ns(time):
+    return pd.Timestamp(time).value
+
+
+def _steps(df, column, freq_ns=None, end=None, origin_ns=0):
+    # The column as a step function: (start ns, value, duration ns) of every step,
+    # split at the bucket edges (origin_ns + k * freq_ns) if freq_ns is given. The last
+    # value lasts until end (default: the last update, so it weighs nothing).
+    times = df.index.as_unit('ns').asi8
+    values = df[column].to_numpy(dtype=np.float64)
+    end_ns = times[-1] if end is None else max(_time_ns(end), times[-1])
+
+    points = times
+    if freq_ns is not None:
+        first_edge = origin_ns + (times[0] - origin_ns) // freq_ns * freq_ns + freq_ns
+        edges = np.arange(first_edge, end_ns, freq_ns, dtype=np.int64)
+        points = np.union1d(times, edges)
+    # Value in the book at every point: the last update at or before it.
+    step_values = values[np.searchsorted(times, points, side='right') - 1]
+    durations = np.diff(np.append(points, end_ns))
+    return points, step_values, durations
+
+
+def time_weighted_spread(df, column='Spread', end=None):
+    if len(df) == 0:
+        return np.nan
+    points, values, durations = _steps(df, column, end=end)
+    total = durations.sum()
+    if total == 0:
+        return np.nan
+    return float((values * durations).sum() / total)
+
+
+def time_weighted_bars(df, freq, column='Spread', end=None, origin=None):
+    # Time-weighted mean of column per bucket of freq, carrying the last value
+    # through the buckets without updates. The buckets start at origin + k * freq;
+    # the default origin is midnight of the first update, as in DataFrame.resample.
+    if len(df) == 0:
+        return pd.Series(dtype=np.float64, name=f'TW {column}')
+    freq_ns = pd.Timedelta(pd.tseries.frequencies.to_offset(freq)).value
+    if origin is None:
+        origin = df.index[0].normalize()
+    origin_ns = pd.Timestamp(origin).as_unit('ns').value
+    points, values, durations = _steps(df, column, freq_ns, end, origin_ns)
+
+    first_bucket = origin_ns + (points[0] - origin_ns) // freq_ns * freq_ns
+    buckets = (points - first_bucket) // freq_ns
+    weighted = np.bincount(buckets, weights=values * durations)
+    total = np.bincount(buckets, weights=durations)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bars = np.where(total > 0, weighted / total, np.nan)
+    index = pd.to_datetime(first_bucket + np.arange(len(bars), dtype=np.int64) * freq_ns, unit='ns')
+    if df.index.tz is not None:
+        index = index.tz_localize('UTC').tz_convert(df.index.tz)
+    return pd.Series(bars, index=index, name=f'TW {column}')
+
+
+def spread_bars(df, freq='1s', percentiles=(0.5, 0.9, 0.99), end=None):
+    # Open/High/Low/Close/Count of the spread updates per bucket, their percentiles
+    # and the time-weighted spread.
+    resampler = df['Spread'].resample(freq)
+    bars = resampler.ohlc()
+    bars.columns = ['Open', 'High', 'Low', 'Close']
+    bars['Count'] = resampler.count()
+    for q in percentiles:
+        bars[f'P{q * 100:g}'] = resampler.quantile(q)
+    # Same bucket edges as the resampler, whatever freq is.
+    origin = bars.index[0] if len(bars) else None
+    bars['TW Spread'] = time_weighted_bars(df, freq, end=end, origin=origin).reindex(bars.index)
+    return bars
+
+
+def spread_statistics(spread_frames, percentiles=(0.5, 0.9, 0.99)):
+    # One row per symbol: update count, mean, time-weighted mean, min, percentiles and max of the spread.
+    rows = {}
+    for symbol, df in spread_frames.items():
+        if len(df) == 0:
+            continue
+        spread = df['Spread'].to_numpy()
+        row = {'Count': len(spread), 'Mean': spread.mean(), 'TW Mean': time_weighted_spread(df), 'Min': spread.min()}
+        for q, value in zip(percentiles, np.quantile(spread, percentiles)):
+            row[f'P{q * 100:g}'] = value
+        row['Max'] = spread.max()
+        rows[symbol] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+
+    books, spread_frames = replay_symbols(file_path)
+    print(spread_statistics(spread_frames))
+
+    df = add_prices(spread_frames['EURUSD_0'])
+    print(df)
+    print(spread_bars(df, '1min'))
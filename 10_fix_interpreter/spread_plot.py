@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from multi_symbol_replay import replay_symbols
+
+
+"""
+
+Downsampled WebGL plots of long Bid/Ask/Spread series.
+
+A day of ticks is millions of points: far more than the pixels of the chart. Every
+series is reduced to about n_points keeping its shape and drawn with Scattergl:
+
+    minmax  first, min, max and last point of every x bucket (one bucket per pixel
+            column), so spikes are never lost. Default.
+    lttb    Largest Triangle Three Buckets, one point per bucket chosen to keep the
+            visual area. Smoother, for line shapes rather than extremes.
+
+The arrays are kept: spread_widget re-downsamples the visible range from them every
+time the x axis is zoomed (in a notebook), and window() does the same for any other
+front end. A static fig.show() / HTML file only has the downsampled points.
+
+"""
+
+PLOT_POINTS = 4000
+
+
+def minmax_indices(x, y, n_points):
+    # Indices of the first, min, max and last point of n_points // 4 equal x buckets.
+    n = len(x)
+    n_buckets = max(n_points // 4, 1)
+    if n <= n_points:
+        return np.arange(n)
+
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, n_buckets - 1)
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    ends = np.append(starts[1:], n) - 1
+
+    # First position of the min and of the max of every bucket. reduceat gives one value
+    # per non-empty bucket, so the points are matched by the rank of their bucket among
+    # those (gaps in the series leave buckets empty).
+    rank = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    is_min = np.flatnonzero(y == np.minimum.reduceat(y, starts)[rank])
+    is_max = np.flatnonzero(y == np.maximum.reduceat(y, starts)[rank])
+    keep = np.concatenate([starts, ends, is_min[np.searchsorted(is_min, starts)], is_max[np.searchsorted(is_max, starts)]])
+    return np.unique(keep)
+
+
+def lttb_indices(x, y, n_points):
+    # Largest Triangle Three Buckets: the first and last point plus, for every one of
+    # n_points - 2 buckets, the point making the largest triangle with the point kept
+    # in the previous bucket and the mean of the next one.
+    n = len(x)
+    if n <= n_points or n_points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bounds = np.linspace(1, n - 1, n_points - 1).astype(np.int64)
+    keep = np.empty(n_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    previous = 0
+    for k in range(n_points - 2):
+        start, stop = bounds[k], bounds[k + 1]
+        next_stop = bounds[k + 2] if k + 2 < len(bounds) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        keep[k + 1] = previous
+    return keep
+
+
+DOWNSAMPLERS = {'minmax': minmax_indices, 'lttb': lttb_indices}
+
+
+def downsample(df, column, n_points=PLOT_POINTS, method='minmax'):
+    # (times, values) of column reduced to about n_points.
+    x = df.index.as_unit('ns').asi8
+    y = df[column].to_numpy()
+    keep = DOWNSAMPLERS[method](x, y, n_points)
+    return df.index[keep], y[keep]
+
+
+def window(df, start=None, end=None, columns=('Bid', 'Ask', 'Spread'), n_points=PLOT_POINTS, method='minmax'):
+    # {column: (times, values)} of the rows in [start, end], downsampled. The rows
+    # are cut by bisecting the time index, not by scanning it.
+    times = df.index.as_unit('ns').asi8
+    i = 0 if start is None else np.searchsorted(times, pd.Timestamp(start).value, side='left')
+    j = len(times) if end is None else np.searchsorted(times, pd.Timestamp(end).value, side='right')
+    # One row on each side so the lines reach the edges of the range.
+    part = df.iloc[max(i - 1, 0):min(j + 1, len(times))]
+    return {column: downsample(part, column, n_points, method) for column in columns}
+
+
+def spread_figure(df, target_symbol, n_points=PLOT_POINTS, method='minmax', figure=go.Figure):
+    # Quote (Bid/Ask) and Spread panels sharing the time axis, downsampled, WebGL traces.
+    fig = figure(make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03, row_heights=[0.6, 0.4]))
+    for column, (times, values) in window(df, n_points=n_points, method=method).items():
+        fig.add_trace(go.Scattergl(x=times, y=values, mode='lines', name=column), row=2 if column == 'Spread' else 1, col=1)
+    fig.update_yaxes(title_text=f'{target_symbol} Quote', row=1, col=1)
+    fig.update_yaxes(title_text=f'{target_symbol} Spread', row=2, col=1)
+    fig.update_layout(xaxis_title='', hovermode='x')
+    return fig
+
+
+def spread_widget(df, target_symbol, n_points=PLOT_POINTS, method='minmax'):
+    # FigureWidget (notebook) whose traces are re-downsampled from df for the
+    # visible range after every zoom or pan. Needs the plotly widget dependencies.
+    fig = spread_figure(df, target_symbol, n_points, method, figure=go.FigureWidget)
+
+    def refetch(layout, x_range, autorange):
+        start, end = (None, None) if autorange else x_range
+        with fig.batch_update():
+            for trace, (times, values) in zip(fig.data, window(df, start, end, n_points=n_points, method=method).values()):
+                trace.x, trace.y = times, values
+
+    fig.layout.on_change(refetch, 'xaxis.range', 'xaxis.autorange')
+    return fig
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+    target_symbol = 'EURUSD_0'
+
+    # The first/min/max/last of every bucket are kept, also on series with gaps (empty
+    # buckets) and with most of the points clustered in a few buckets.
+    rng = np.random.default_rng(0)
+    gapped = np.concatenate([np.arange(50000), np.arange(50000) + 10 ** 7])
+    clustered = np.sort(np.concatenate([rng.integers(0, 10 ** 4, 90000), rng.integers(0, 10 ** 7, 10000)]))
+    for x in (gapped, clustered):
+        y = rng.normal(size=len(x))
+        keep = minmax_indices(x, y, PLOT_POINTS)
+        edges = np.linspace(x[0], x[-1], PLOT_POINTS // 4 + 1)
+        bucket = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, PLOT_POINTS // 4 - 1)
+        for b in np.unique(bucket):
+            members = np.flatnonzero(bucket == b)
+            expected = {members[0], members[-1], members[np.argmin(y[members])], members[np.argmax(y[members])]}
+            assert expected <= set(keep[np.isin(keep, members)]), b
+    print('minmax_indices keeps the extremes of every bucket')
+
+    books, spread_frames = replay_symbols(file_path, symbols=[target_symbol])
+    spread_figure(spread_frames[target_symbol], target_symbol).show()
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from liquidity_book import pip_size
+from log_time import log_time_ns
+
+
+"""
+
+Columnar recorder for the top of book / spread series.
+
+Rows are appended into growable NumPy arrays (time as int64 ns since the epoch,
+Bid, Ask, Spread in pips and the sizes at the top) and the DataFrame is built once at the end, instead
+of a one-row DataFrame plus pd.concat per book update.
+For very long runs record_chunks yields DataFrames of chunk_size rows and keeps
+only the current chunk in memory.
+
+"""
+
+class SpreadRecorder:
+    def __init__(self, symbol, capacity=4096):
+        self.symbol = symbol
+        self.pip = pip_size(symbol)
+        self.size = 0
+        self.time = np.empty(capacity, dtype=np.int64)
+        self.bid = np.empty(capacity, dtype=np.float64)
+        self.ask = np.empty(capacity, dtype=np.float64)
+        self.spread = np.empty(capacity, dtype=np.float64)
+        self.bid_size = np.empty(capacity, dtype=np.float64)
+        self.ask_size = np.empty(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = 2 * len(self.time)
+        for name in ('time', 'bid', 'ask', 'spread', 'bid_size', 'ask_size'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def append(self, time_ns, bid, ask, bid_size=np.nan, ask_size=np.nan):
+        if self.size == len(self.time):
+            self._grow()
+        i = self.size
+        self.time[i] = time_ns
+        self.bid[i] = bid
+        self.ask[i] = ask
+        self.spread[i] = (ask - bid) / self.pip
+        self.bid_size[i] = bid_size
+        self.ask_size[i] = ask_size
+        self.size += 1
+
+    def record(self, liquidity_book, time_ns):
+        # Appends the top of book. Returns False if one of the sides is empty.
+        quote = liquidity_book.quote()
+        if quote is None:
+            return False
+        self.append(time_ns, *quote)
+        return True
+
+    def to_frame(self, start=0, stop=None):
+        # Bid/Ask/Spread DataFrame indexed by time (the spread in pips of the symbol),
+        # plus the Bid Size/Ask Size of the top for the spread analytics.
+        if stop is None:
+            stop = self.size
+        return pd.DataFrame({
+            'Bid': self.bid[start:stop].copy(),
+            'Ask': self.ask[start:stop].copy(),
+            'Spread': self.spread[start:stop].copy(),
+            'Bid Size': self.bid_size[start:stop].copy(),
+            'Ask Size': self.ask_size[start:stop].copy(),
+        }, index=pd.to_datetime(self.time[start:stop], unit='ns'))
+
+    def iter_frames(self, chunk_size):
+        for start in range(0, self.size, chunk_size):
+            yield self.to_frame(start, min(start + chunk_size, self.size))
+
+    def clear(self):
+        self.size = 0
+
+    def trim(self, keep):
+        # Keeps only the last keep rows, for series recorded without end (log_follow).
+        if self.size <= keep:
+            return
+        start = self.size - keep
+        for name in ('time', 'bid', 'ask', 'spread', 'bid_size', 'ask_size'):
+            column = getattr(self, name)
+            column[:keep] = column[start:self.size]
+        self.size = keep
+
+    def drain(self):
+        # DataFrame of the recorded rows, emptying the recorder.
+        df = self.to_frame()
+        self.clear()
+        return df
+
+
+def record_chunks(updates, chunk_size=100000):
+    # Consumes (log time, symbol, liquidity_book) updates (log_pipeline.update_books)
+    # and yields (symbol, DataFrame) every chunk_size rows of a symbol, then the rest.
+    recorders = {}
+    for time_str, symbol, liquidity_book in updates:
+        if symbol not in recorders:
+            recorders[symbol] = SpreadRecorder(symbol, capacity=min(chunk_size, 4096))
+        recorder = recorders[symbol]
+        if recorder.record(liquidity_book, log_time_ns(time_str)) and len(recorder) >= chunk_size:
+            yield symbol, recorder.drain()
+
+    for symbol, recorder in recorders.items():
+        if len(recorder):
+            yield symbol, recorder.drain()
@@ -0,0 +1,343 @@
+import os
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from liquidity_book import pip_size, top_of_book
+from log_time import log_time_ns, to_ns
+from log_merge import merge_lines, log_days
+from log_pipeline import extract_fix, parse_messages, update_books
+
+
+"""
+
+Streaming spread aggregates per (symbol, time bucket) for months of logs.
+
+No tick is stored: every book update goes into the bucket of its symbol and time,
+which keeps
+
+    Count, Min, Max           of the spread updates
+    P50 / P90 / P99 ...       from a quantile sketch of the updates (SpreadSketch)
+    TW Spread                 time-weighted mean, every value weighted by how long it
+                              was in the book and carried through buckets without updates
+
+SpreadSketch is a DDSketch: values are counted in logarithmic bins of ratio
+gamma = (1 + a) / (1 - a), so any quantile is within a relative accuracy a
+(1% by default) of the exact one, with a few hundred bins at most. Sketches of the same
+accuracy merge exactly by adding the bin counts: aggregates of parallel shards or of
+different days (SpreadAggregator.merge, save/load as JSON) give the same quantiles as
+one pass over the same book updates. A shard has to start from the books of the pass
+it replaces, so aggregate_logs_parallel runs one job per day of hourly logs (the books
+start empty every day) rather than one per hour.
+
+    aggregator = aggregate_logs('20230425-*_quote.log')
+    aggregator.save('20230425_spread.json')
+    month = SpreadAggregator.load('20230425_spread.json').merge(...)
+    month.frame()           (symbol, bucket) x Count/TW Spread/Min/P50/P90/P99/Max
+
+The columns follow spread_analytics.spread_bars / spread_statistics, which compute the
+exact values from a spread frame in memory.
+
+"""
+
+BUCKET = '5min'
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1e-9  # |spread| below it counts as 0 (locked book).
+
+
+class SpreadSketch:
+    # DDSketch of the spread values: {bin: count} for the positive and negative
+    # (crossed book) values and a count of zeros.
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        if value > MIN_VALUE:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < -MIN_VALUE:
+            key = math.ceil(math.log(-value) / self._log_gamma)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero += 1
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _value(self, key):
+        # Value of a bin, within relative_accuracy of everything counted in it.
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):  # most negative first.
+            seen += self.negative[key]
+            if seen > rank:
+                return max(-self._value(key), self.min)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self._value(key), self.max)
+        return self.max
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f'cannot merge sketches of accuracy {self.relative_accuracy} and {other.relative_accuracy}')
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'positive': sorted(self.positive.items()),
+            'negative': sorted(self.negative.items()),
+            'zero': self.zero,
+            'count': self.count,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.positive = {key: count for key, count in data['positive']}
+        sketch.negative = {key: count for key, count in data['negative']}
+        sketch.zero = data['zero']
+        sketch.count = data['count']
+        if sketch.count:
+            sketch.min, sketch.max = data['min'], data['max']
+        return sketch
+
+
+class SpreadBucket:
+    # Aggregates of one (symbol, bucket): the sketch of the updates and the
+    # time-weighted sum (spread x ns) over the time covered.
+    __slots__ = ('sketch', 'weighted', 'duration')
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.sketch = SpreadSketch(relative_accuracy)
+        self.weighted = 0.0
+        self.duration = 0
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        self.weighted += other.weighted
+        self.duration += other.duration
+        return self
+
+    def to_dict(self):
+        return {'sketch': self.sketch.to_dict(), 'weighted': self.weighted, 'duration': self.duration}
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls.__new__(cls)
+        bucket.sketch = SpreadSketch.from_dict(data['sketch'])
+        bucket.weighted = data['weighted']
+        bucket.duration = data['duration']
+        return bucket
+
+
+class SpreadAggregator:
+    # {(symbol, bucket start ns): SpreadBucket}, fed one update at a time.
+
+    def __init__(self, bucket=BUCKET, relative_accuracy=RELATIVE_ACCURACY):
+        self.bucket_ns = pd.Timedelta(bucket).value
+        self.relative_accuracy = relative_accuracy
+        self.buckets = {}
+        self.first = {}  # symbol: time ns of the first update.
+        self.last = {}  # symbol: (time ns, spread) of the last update.
+        self._pips = {}
+
+    def _bucket(self, symbol, start_ns):
+        key = (symbol, start_ns)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = SpreadBucket(self.relative_accuracy)
+        return bucket
+
+    def _hold(self, symbol, spread, start_ns, end_ns):
+        # spread was in the book from start_ns to end_ns: weighted into every bucket it spans.
+        bucket_ns = self.bucket_ns
+        while start_ns < end_ns:
+            bucket_start = start_ns // bucket_ns * bucket_ns
+            stop_ns = min(bucket_start + bucket_ns, end_ns)
+            bucket = self._bucket(symbol, bucket_start)
+            bucket.weighted += spread * (stop_ns - start_ns)
+            bucket.duration += stop_ns - start_ns
+            start_ns = stop_ns
+
+    def add(self, symbol, time_ns, spread):
+        # One spread update (pips) of symbol, in time order per symbol.
+        last = self.last.get(symbol)
+        if last is None:
+            self.first[symbol] = time_ns
+        else:
+            self._hold(symbol, last[1], last[0], time_ns)
+        self._bucket(symbol, time_ns // self.bucket_ns * self.bucket_ns).sketch.add(spread)
+        self.last[symbol] = (time_ns, spread)
+
+    def record(self, liquidity_book, symbol, time_ns):
+        # Adds the spread of the book. Returns False if one of the sides is empty.
+        top = top_of_book(liquidity_book)
+        if top is None:
+            return False
+        pip = self._pips.get(symbol)
+        if pip is None:
+            pip = self._pips[symbol] = pip_size(symbol)
+        bid, ask = top
+        self.add(symbol, time_ns, (ask - bid) / pip)
+        return True
+
+    def close(self, end_time):
+        # Carries the last spread of every symbol until end_time (e.g. the end of the
+        # day). Without it the last value lasts until its own update and weighs nothing.
+        end_ns = to_ns(end_time)
+        for symbol, (time_ns, spread) in self.last.items():
+            if time_ns < end_ns:
+                self._hold(symbol, spread, time_ns, end_ns)
+                self.last[symbol] = (end_ns, spread)
+
+    def merge(self, other):
+        # Adds the aggregates of other (another shard, day or feed) of the same buckets.
+        # Between shards adjacent in time the last spread of the earlier one is carried
+        # until the first update of the later one, as in a single pass, so shards have to
+        # be merged in time order for the TW Spread (counts and quantiles merge in any order).
+        if other.bucket_ns != self.bucket_ns:
+            raise ValueError(f'cannot merge buckets of {self.bucket_ns} ns and {other.bucket_ns} ns')
+        for key, bucket in other.buckets.items():
+            if key in self.buckets:
+                self.buckets[key].merge(bucket)
+            else:
+                self.buckets[key] = SpreadBucket.from_dict(bucket.to_dict())
+
+        for symbol, (last_ns, last_spread) in other.last.items():
+            if symbol not in self.last:
+                self.first[symbol] = other.first[symbol]
+                self.last[symbol] = (last_ns, last_spread)
+                continue
+            if self.last[symbol][0] <= other.first[symbol]:
+                self._hold(symbol, self.last[symbol][1], self.last[symbol][0], other.first[symbol])
+                self.last[symbol] = (last_ns, last_spread)
+            elif last_ns <= self.first[symbol]:
+                self._hold(symbol, last_spread, last_ns, self.first[symbol])
+                self.first[symbol] = other.first[symbol]
+            else:
+                # Overlapping in time: nothing to carry.
+                self.first[symbol] = min(self.first[symbol], other.first[symbol])
+                self.last[symbol] = max(self.last[symbol], (last_ns, last_spread))
+        return self
+
+    def frame(self, percentiles=(0.5, 0.9, 0.99)):
+        # DataFrame indexed by (symbol, bucket time): Count, TW Spread, Min, percentiles, Max.
+        rows = []
+        for (symbol, start_ns), bucket in sorted(self.buckets.items()):
+            sketch = bucket.sketch
+            row = {
+                'Symbol': symbol,
+                'Time': start_ns,
+                'Count': sketch.count,
+                'TW Spread': bucket.weighted / bucket.duration if bucket.duration else math.nan,
+                'Min': sketch.min if sketch.count else math.nan,
+            }
+            for q in percentiles:
+                row[f'P{q * 100:g}'] = sketch.quantile(q)
+            row['Max'] = sketch.max if sketch.count else math.nan
+            rows.append(row)
+        columns = ['Symbol', 'Time', 'Count', 'TW Spread', 'Min'] + [f'P{q * 100:g}' for q in percentiles] + ['Max']
+        df = pd.DataFrame(rows, columns=columns)
+        df['Time'] = pd.to_datetime(df['Time'], unit='ns')
+        return df.set_index(['Symbol', 'Time'])
+
+    def to_dict(self):
+        return {
+            'bucket_ns': self.bucket_ns,
+            'relative_accuracy': self.relative_accuracy,
+            'buckets': [[symbol, start_ns, bucket.to_dict()] for (symbol, start_ns), bucket in sorted(self.buckets.items())],
+            'first': self.first,
+            'last': {symbol: list(last) for symbol, last in self.last.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregator = cls(pd.Timedelta(data['bucket_ns'], unit='ns'), data['relative_accuracy'])
+        aggregator.buckets = {(symbol, start_ns): SpreadBucket.from_dict(bucket) for symbol, start_ns, bucket in data['buckets']}
+        aggregator.first = dict(data['first'])
+        aggregator.last = {symbol: tuple(last) for symbol, last in data['last'].items()}
+        return aggregator
+
+    def save(self, path):
+        with open(path, 'w') as json_file:
+            json.dump(self.to_dict(), json_file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as json_file:
+            return cls.from_dict(json.load(json_file))
+
+
+def aggregate_updates(updates, aggregator=None):
+    # Consumes (log time, symbol, liquidity_book) updates (log_pipeline.update_books).
+    if aggregator is None:
+        aggregator = SpreadAggregator()
+    for time_str, symbol, liquidity_book in updates:
+        aggregator.record(liquidity_book, symbol, log_time_ns(time_str))
+    return aggregator
+
+
+def aggregate_logs(files, symbols=None, bucket=BUCKET, relative_accuracy=RELATIVE_ACCURACY, n_depths=5):
+    # One pass over a log, a glob pattern or a list of logs (time-ordered merge).
+    if symbols is not None:
+        symbols = set(symbols)
+    updates = update_books(parse_messages(extract_fix(merge_lines(files))), None, n_depths, symbols)
+    return aggregate_updates(updates, SpreadAggregator(bucket, relative_accuracy))
+
+
+def aggregate_logs_parallel(files, symbols=None, bucket=BUCKET, relative_accuracy=RELATIVE_ACCURACY, n_depths=5, workers=None):
+    # One aggregate_logs job per day of hourly logs (e.g. a month), merged in time order.
+    # The books are carried through the hours of a day and start empty every day, as
+    # the session does (logon with 141=Y): the result is that of aggregate_logs day by day.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(aggregate_logs, day, symbols, bucket, relative_accuracy, n_depths)
+                   for day in log_days(files)]
+        aggregator = SpreadAggregator(bucket, relative_accuracy)
+        for future in futures:
+            aggregator.merge(future.result())
+    return aggregator
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+
+    aggregator = aggregate_logs(file_path)
+    aggregator.save('20230425-0800_spread.json')
+    print(SpreadAggregator.load('20230425-0800_spread.json').frame())
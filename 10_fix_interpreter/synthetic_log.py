@@ -0,0 +1,115 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+from liquidity_book import pip_size
+
+
+"""
+
+Synthetic quote logs in the format of the real ones, for tests and benchmarks:
+
+    2023-04-25 07:00:00.123|8=FIX.4.4\x019=...\x0135=i\x01...\x0110=...\x01
+
+    35=i  Mass Quote: 296 quote sets, each 302 QuoteSetID (symbol), 295 entries of
+          299 level, 188/190 bid/ask price, 134/135 bid/ask size.
+    35=W  Full Refresh: 262/55 symbol, 268 entries of 269 side, 299 level, 270 price, 271 size.
+
+Every symbol has a random walk mid with levels spread one pip apart. A cancelled
+side is quoted with size -1. Messages arrive as a Poisson process of `rate` per
+second. The same seed writes the same log.
+
+"""
+
+MAJORS = ['EURUSD', 'GBPUSD', 'USDJPY', 'AUDUSD', 'USDCHF', 'USDCAD', 'NZDUSD', 'EURGBP',
+          'EURJPY', 'GBPJPY', 'AUDNZD', 'EURCHF', 'AUDJPY', 'CADJPY', 'EURAUD', 'GBPCHF']
+MID_PRICES = {'JPY': 150.0}
+
+
+def symbol_names(n_symbols):
+    # EURUSD_0, GBPUSD_0, ... then EURUSD_1, ... as the provider numbers its streams.
+    return [f'{MAJORS[k % len(MAJORS)]}_{k // len(MAJORS)}' for k in range(n_symbols)]
+
+
+def _fix_message(msg_type, seq, sending_time, body_fields):
+    body = f'35={msg_type}\x0149=LP\x0156=CLIENT\x0134={seq}\x0152={sending_time}\x01' + body_fields
+    head = f'8=FIX.4.4\x019={len(body)}\x01'
+    checksum = sum((head + body).encode()) % 256
+    return f'{head}{body}10={checksum:03d}\x01'
+
+
+class _Market:
+    def __init__(self, symbol, n_depths, rng):
+        self.symbol = symbol
+        self.pip = pip_size(symbol)
+        self.mid = MID_PRICES['JPY'] if 'JPY' in symbol else 1.1 + rng.random() * 0.2
+        self.n_depths = n_depths
+        self.rng = rng
+
+    def step(self):
+        self.mid += self.rng.gauss(0, 0.3) * self.pip
+        return self.mid
+
+    def side(self, level, sign, cancel_ratio):
+        # (price, size) of one side of a level. A cancel has size -1.
+        if self.rng.random() < cancel_ratio:
+            return 0.0, -1
+        half_spread = (0.5 + 0.5 * self.rng.random()) * self.pip
+        price = self.mid + sign * (half_spread + level * self.pip + self.rng.randint(0, 3) * 0.1 * self.pip)
+        return price, self.rng.randint(1, 50) * 100000
+
+
+def generate_log(file_path, n_messages=100000, n_symbols=10, n_depths=5, rate=1000.0,
+                 full_refresh_ratio=0.05, cancel_ratio=0.02, max_quote_sets=3, seed=0,
+                 start_time='2023-04-25 07:00:00.000'):
+    # Writes n_messages Mass Quotes / Full Refreshes to file_path. Returns the byte size.
+    rng = random.Random(seed)
+    markets = [_Market(symbol, n_depths, rng) for symbol in symbol_names(n_symbols)]
+    digits = {market.symbol: 3 if market.pip == 0.01 else 5 for market in markets}
+    msg_time = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S.%f')
+
+    with open(file_path, 'w', newline='\n') as log_file:
+        for seq in range(1, n_messages + 1):
+            msg_time += timedelta(seconds=rng.expovariate(rate))
+            log_time = msg_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+            sending_time = msg_time.strftime('%Y%m%d-%H:%M:%S.%f')[:-3]
+
+            if rng.random() < full_refresh_ratio:
+                market = rng.choice(markets)
+                market.step()
+                d = digits[market.symbol]
+                fields = f'262={market.symbol}\x0155={market.symbol}\x01268={2 * n_depths}\x01'
+                for level in range(n_depths):
+                    for entry_type, sign in ((0, -1), (1, 1)):
+                        price, size = market.side(level, sign, cancel_ratio)
+                        fields += f'269={entry_type}\x01299={level}\x01270={price:.{d}f}\x01271={size}\x01'
+                message = _fix_message('W', seq, sending_time, fields)
+            else:
+                quote_sets = rng.sample(markets, rng.randint(1, min(max_quote_sets, len(markets))))
+                fields = f'117={seq}\x01296={len(quote_sets)}\x01'
+                for market in quote_sets:
+                    market.step()
+                    d = digits[market.symbol]
+                    # The top is requoted every time so stale levels rarely cross the moving mid.
+                    levels = [0] + sorted(rng.sample(range(1, n_depths), rng.randint(0, n_depths - 1)))
+                    fields += f'302={market.symbol}\x01295={len(levels)}\x01'
+                    for level in levels:
+                        bid, bid_size = market.side(level, -1, cancel_ratio)
+                        ask, ask_size = market.side(level, 1, cancel_ratio)
+                        fields += (f'299={level}\x01188={bid:.{d}f}\x01190={ask:.{d}f}\x01'
+                                   f'134={bid_size}\x01135={ask_size}\x01')
+                message = _fix_message('i', seq, sending_time, fields)
+
+            log_file.write(f'{log_time}|{message}\n')
+    return os.path.getsize(file_path)
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = 'synthetic_quote.log'
+
+    size = generate_log(file_path, n_messages=200000, n_symbols=20)
+    print(file_path, size)
@@ -0,0 +1,176 @@
+import os
+import re
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from log_index import read_lines
+from fix_tokenizer import tokenize, get_field, quote_sets, md_entries
+from liquidity_book import new_liquidity_book
+from spread_recorder import SpreadRecorder
+from log_time import log_time_ns, ns_to_datetime, to_ns
+
+
+"""
+
+Columnar tick store for quote logs.
+
+convert_log turns a *_quote.log into one row per book side update:
+
+    time_ns, symbol, side (0 Bid, 1 Ask), level (299), price, size, msg_type (35), seq
+
+seq is the line number of the message in its log, so the updates of one message can
+be grouped back together. A missing price or size is null. The store is a Parquet
+dataset partitioned by date=YYYYMMDD/symbol=XXX, sorted by time inside every file,
+so the readers below only touch the partitions, row groups and columns they need.
+
+"""
+
+SCHEMA = pa.schema([
+    ('time_ns', pa.int64()),
+    ('side', pa.int8()),
+    ('level', pa.int16()),
+    ('price', pa.float64()),
+    ('size', pa.float64()),
+    ('msg_type', pa.string()),
+    ('seq', pa.int64()),
+    ('date', pa.string()),
+    ('symbol', pa.string()),
+])
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string()), ('symbol', pa.string())]), flavor='hive')
+ROWS_PER_CHUNK = 1000000
+
+
+def _write_chunk(columns, store_path, basename):
+    table = pa.table(columns, schema=SCHEMA).sort_by([('symbol', 'ascending'), ('time_ns', 'ascending'), ('seq', 'ascending')])
+    ds.write_dataset(table, store_path, format='parquet', partitioning=PARTITIONING,
+                     basename_template=basename + '-{i}.parquet', existing_data_behavior='overwrite_or_ignore')
+
+
+def _remove_log_files(store_path, log_name):
+    # Removes the files written by a previous conversion of log_name, in every partition,
+    # and the partition directories left empty. The files of the other logs sharing the
+    # partitions (the hourly logs of a day) are kept.
+    log_file = re.compile(re.escape(log_name) + r'-\d+-\d+\.parquet$')
+    for dir_path, dir_names, file_names in os.walk(store_path, topdown=False):
+        for file_name in file_names:
+            if log_file.match(file_name):
+                os.remove(os.path.join(dir_path, file_name))
+        if dir_path != store_path and not os.listdir(dir_path):
+            os.rmdir(dir_path)
+
+
+def convert_log(file_path, store_path, rows_per_chunk=ROWS_PER_CHUNK):
+    # Appends the book updates of file_path to the store. Converting the same log
+    # again replaces its files (none of the previous conversion is left behind).
+    log_name = os.path.splitext(os.path.basename(file_path))[0]
+    _remove_log_files(store_path, log_name)
+    names = SCHEMA.names
+    columns = {name: [] for name in names}
+    chunk = 0
+
+    for seq, line in enumerate(read_lines(file_path)):
+        if '35=W' not in line and '35=i' not in line:
+            continue
+        time_str = line.split('|', 1)[0]
+        pairs = tokenize(line)
+        msg_type = get_field(pairs, '35')
+        rows = []
+
+        if msg_type == 'W':
+            symbols, entries = md_entries(pairs)
+            for entry_type, level, price, size in entries:
+                if entry_type in (0, 1) and level is not None:
+                    rows.extend((symbol, entry_type, level, price, size) for symbol in symbols)
+        elif msg_type == 'i':
+            for symbol, entries in quote_sets(pairs):
+                for level, bid, ask, bid_size, ask_size in entries:
+                    if bid is not None or bid_size is not None:
+                        rows.append((symbol, 0, level, bid, bid_size))
+                    if ask is not None or ask_size is not None:
+                        rows.append((symbol, 1, level, ask, ask_size))
+
+        if not rows:
+            continue
+        time_ns = log_time_ns(time_str)
+        date = time_str[:10].replace('-', '')
+        for symbol, side, level, price, size in rows:
+            columns['time_ns'].append(time_ns)
+            columns['side'].append(side)
+            columns['level'].append(level)
+            columns['price'].append(price)
+            columns['size'].append(size)
+            columns['msg_type'].append(msg_type)
+            columns['seq'].append(seq)
+            columns['date'].append(date)
+            columns['symbol'].append(symbol)
+
+        if len(columns['seq']) >= rows_per_chunk:
+            _write_chunk(columns, store_path, f'{log_name}-{chunk}')
+            columns = {name: [] for name in names}
+            chunk += 1
+
+    if columns['seq']:
+        _write_chunk(columns, store_path, f'{log_name}-{chunk}')
+
+
+def read_events(store_path, target_symbol, start_time=None, end_time=None, columns=('time_ns', 'seq', 'side', 'level', 'price', 'size')):
+    # Updates of target_symbol in [start_time, end_time] sorted as they were logged.
+    # Only the symbol partition, the row groups in the time range and the columns asked for are read.
+    dataset = ds.dataset(store_path, format='parquet', partitioning=PARTITIONING)
+    condition = ds.field('symbol') == target_symbol
+    if start_time is not None:
+        condition &= ds.field('time_ns') >= to_ns(start_time)
+        condition &= ds.field('date') >= _as_datetime(start_time).strftime('%Y%m%d')
+    if end_time is not None:
+        condition &= ds.field('time_ns') <= to_ns(end_time)
+        condition &= ds.field('date') <= _as_datetime(end_time).strftime('%Y%m%d')
+    table = dataset.to_table(columns=list(columns), filter=condition)
+    return table.sort_by([('time_ns', 'ascending'), ('seq', 'ascending')])
+
+
+def _as_datetime(time):
+    return ns_to_datetime(to_ns(time))
+
+
+def replay_store(store_path, target_symbol, target_time, n_depths=5, spreads=True):
+    # (liquidity_book, spread DataFrame or None) of target_symbol at target_time, as
+    # analyze_fix_log computes them from the log.
+    table = read_events(store_path, target_symbol, end_time=target_time)
+    time_ns = table['time_ns'].to_numpy()
+    seq = table['seq'].to_numpy()
+    side = table['side'].to_numpy()
+    level = table['level'].to_numpy()
+    price = table['price'].to_numpy(zero_copy_only=False)
+    size = table['size'].to_numpy(zero_copy_only=False)
+
+    liquidity_book = new_liquidity_book(n_depths)
+    recorder = SpreadRecorder(target_symbol) if spreads else None
+    updates = (liquidity_book.update_bid, liquidity_book.update_ask)
+
+    n = len(time_ns)
+    for i in range(n):
+        updates[side[i]](int(level[i]),
+                         None if np.isnan(price[i]) else float(price[i]),
+                         None if np.isnan(size[i]) else float(size[i]))
+
+        # The spread is recorded once per message, after its last update.
+        if recorder is not None and (i == n - 1 or seq[i + 1] != seq[i] or time_ns[i + 1] != time_ns[i]):
+            recorder.record(liquidity_book, int(time_ns[i]))
+
+    return liquidity_book, recorder.to_frame() if recorder is not None else None
+
+
+#------------------------------------------------------------------------------------------#
+if __name__ == '__main__':
+    # Change to working path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    file_path = '20230425-0800_quote.log'
+    store_path = 'tick_store'
+
+    convert_log(file_path, store_path)
+
+    liquidity_book, df = replay_store(store_path, 'AUDNZD_0', '2023-04-25 07:05:00.039')
+    print(liquidity_book)
+    print(df)